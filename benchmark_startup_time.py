@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+# Scripts whose import time is measured by default
+SCRIPT_MODULES = [
+    'edit_tracks_properties',
+    'extract_episode_artwork',
+    'extract_subtitles',
+    'load_episode_data',
+    'remux_files',
+    'rename_files',
+    'save_episode_data',
+    'snapshot_library_data',
+    'verify_files',
+]
+
+# Number of fresh interpreters started for each module; the fastest run is kept to filter out noise
+DEFAULT_RUNS = 5
+
+# Import time in milliseconds, on top of the bare interpreter startup, that a script should stay under
+DEFAULT_TARGET_MS = 100
+
+# Modules that should never be imported just by starting a script
+HEAVY_MODULES = ['plexapi', 'dotenv', 'pycountry', 'PIL']
+
+def time_command(code, runs=DEFAULT_RUNS):
+    """Return the fastest wall-clock time, in milliseconds, of running the code in a fresh interpreter."""
+    project_directory = os.path.dirname(os.path.abspath(__file__))
+    timings = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=project_directory, check=True)
+        timings.append((time.perf_counter() - start_time) * 1000)
+    return min(timings)
+
+def get_loaded_heavy_modules(module_name):
+    """Return the heavy modules that importing the module loads."""
+    project_directory = os.path.dirname(os.path.abspath(__file__))
+    code = f'import sys, {module_name}; print(" ".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+    result = subprocess.run([sys.executable, '-c', code], cwd=project_directory, stdout=subprocess.PIPE, text=True, check=True)
+    return result.stdout.split()
+
+def benchmark_startup_time(module_names, runs=DEFAULT_RUNS, target_ms=DEFAULT_TARGET_MS):
+    """Print the import time of every module and return True if all of them are under the target."""
+    baseline_ms = time_command('pass', runs=runs)
+    print(f'Bare interpreter startup: {baseline_ms:.1f} ms')
+
+    all_under_target = True
+    for module_name in module_names:
+        import_ms = time_command(f'import {module_name}', runs=runs) - baseline_ms
+        heavy_modules = get_loaded_heavy_modules(module_name)
+        is_under_target = import_ms <= target_ms and not heavy_modules
+        all_under_target = all_under_target and is_under_target
+
+        status = 'OK' if is_under_target else 'SLOW'
+        line = f'{status:4}  {module_name:24} {import_ms:7.1f} ms'
+        if heavy_modules:
+            line += f'  (imports {", ".join(heavy_modules)})'
+        print(line)
+
+    return all_under_target
+
+def main(args):
+    module_names = args.modules or SCRIPT_MODULES
+
+    print(f'Measuring the import time of {len(module_names)} module(s) against a target of {args.target_ms} ms. . .')
+    if benchmark_startup_time(module_names, runs=args.runs, target_ms=args.target_ms):
+        print("\nAll modules start within the target.")
+    else:
+        print("\nSome modules are over the target.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='benchmarkstartup', description="Measure how long each script takes to import and check it against a target.")
+    parser.add_argument('modules', nargs='*', help='Modules to measure (defaults to every script)')
+    parser.add_argument('-n', '--runs', type=int, default=DEFAULT_RUNS, help='Number of runs per module; the fastest one is kept.')
+    parser.add_argument('-t', '--target-ms', type=float, default=DEFAULT_TARGET_MS, help='Maximum import time in milliseconds, on top of the bare interpreter startup.')
+
+    args = parser.parse_args()
+    main(args)
@@ -1,8 +1,13 @@
 import os
 import argparse
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed, Future
 from utils.file_management_helpers import *
 from utils.prompt_helpers import *
+from utils.concurrency_helpers import start_background_task, collect_background_result
+
+# Number of files edited with mkvpropedit at the same time
+EDIT_WORKERS = 4
 
 def prompt_for_new_tracks_info(tracks_info, force_language_prompt=False, ask_for_additional_flags=False):
     """Ask the user to give flags, names, and languages to each type of track."""
@@ -45,8 +50,8 @@ def prompt_for_new_tracks_info(tracks_info, force_language_prompt=False, ask_for
 
     return updated_tracks_info
 
-def update_track_properties(file_path, tracks_info, set_additional_flags=False):
-    """Update the default and forced properties of the tracks using mkvpropedit."""
+def update_track_properties(file_path, tracks_info, set_additional_flags=False, capture_output=False):
+    """Update the default and forced properties of the tracks with a single mkvpropedit call so the header is only rewritten once."""
     additional_flags_names = [
         'flag_original',
         'flag_hearing_impaired',
@@ -55,33 +60,61 @@ def update_track_properties(file_path, tracks_info, set_additional_flags=False):
         'flag_commentary'
     ]
 
+    command = ['mkvpropedit', file_path]
     for track in tracks_info:
         track_number = track['number']
         default_flag = '1' if track['default_track'] else '0'
         forced_flag = '1' if track['forced_track'] else '0'
         language = track['language']
 
-        # Create the command to run
-        command = f'mkvpropedit "{file_path}" --edit track:{track_number} --set flag-default={default_flag} --set flag-forced={forced_flag} --set language="{language}"'
+        # Add the edits for this track to the command
+        command += ['--edit', f'track:{track_number}', '--set', f'flag-default={default_flag}', '--set', f'flag-forced={forced_flag}', '--set', f'language={language}']
 
         # Add the name tag if present
         track_name = track['track_name']
         if track_name and track_name != 'N/A':
-            command += f' --set name="{track_name}"'
+            command += ['--set', f'name={track_name}']
 
         # Add additional flags to the command if present
         if set_additional_flags:
             for flag_name in additional_flags_names:
                 flag = '1' if track[flag_name] else '0'
                 header_name = re.sub('_', '-', flag_name).strip()
-                command += f' --set {header_name}={flag}'
-
-        subprocess.run(command, shell=True)
+                command += ['--set', f'{header_name}={flag}']
+
+    return subprocess.run(command, capture_output=capture_output, text=True)
+
+def update_files_track_properties(file_paths, tracks_info, set_additional_flags=False, max_workers=EDIT_WORKERS):
+    """Update the track properties of all the files, editing several files at the same time."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(update_track_properties, file_path, tracks_info, set_additional_flags=set_additional_flags, capture_output=True): file_path
+            for file_path in file_paths
+        }
+        for future in as_completed(futures):
+            file_path = futures[future]
+            result = future.result()
+            # mkvpropedit returns 1 when there were only warnings
+            if result.returncode in (0, 1):
+                print(f'Edited "{os.path.basename(file_path)}"')
+            else:
+                print(f'Could not edit "{os.path.basename(file_path)}":')
+                print(result.stdout.strip())
+
+def edit_mkv_tracks_properties(file_paths, force_language_prompt=False, ask_for_additional_flags=False, max_workers=EDIT_WORKERS, first_file_path=None):
+    """Prompt the user to set the tages of the example track, and set the tags for all files.
+
+    The file paths can also be a future from start_background_task that is still finding the files while
+    the user is prompted, in which case the first file path must be given to serve as the template.
+    """
+    if first_file_path is None:
+        first_file_path = file_paths[0]
 
-def edit_mkv_tracks_properties(file_paths, force_language_prompt=False, ask_for_additional_flags=False):
-    """Prompt the user to set the tages of the example track, and set the tags for all files."""
     # Get the first track's info to use as a template
-    first_tracks_info = get_tracks_info(file_paths[0])
+    first_tracks_info = get_tracks_info(first_file_path)
+    if first_tracks_info is None:
+        print("Aborting. . .")
+        return
     
     # Prompt the user to give the new order and default/forced status for the tracks
     tracks_template = prompt_for_new_tracks_info(first_tracks_info, force_language_prompt=force_language_prompt, ask_for_additional_flags=ask_for_additional_flags)
@@ -95,9 +128,19 @@ def edit_mkv_tracks_properties(file_paths, force_language_prompt=False, ask_for_
         print("Aborting. . .")
         return
 
-    for file_path in file_paths:
-        # Update track properties
-        update_track_properties(file_path, tracks_template, set_additional_flags=ask_for_additional_flags)
+    # Wait for the files that were being probed and matched while the user was prompted
+    if isinstance(file_paths, Future):
+        try:
+            file_paths = collect_background_result(file_paths)
+        except Exception as e:
+            print(f"Could not find the files to edit: {e}. Aborting. . .")
+            return
+        if not file_paths:
+            print("No matching files found to edit. Aborting. . .")
+            return
+
+    # Update track properties
+    update_files_track_properties(file_paths, tracks_template, set_additional_flags=ask_for_additional_flags, max_workers=max_workers)
 
     print("Finished editing files.")
 
@@ -105,15 +148,23 @@ def main(args):
     directory = args.directory
     force_language_prompt = args.force_language_prompt
     ask_for_additional_flags = args.prompt_additional_tags
+    max_workers = args.workers
+
+    video_files = get_video_files_from_directory(directory)
+    if not video_files:
+        print("No .mkv, .mp4, or .avi files were found in the directory.")
+        return
 
-    mkv_files_to_modify = get_matching_files_from_directory(directory)
-    edit_mkv_tracks_properties(mkv_files_to_modify, force_language_prompt=force_language_prompt, ask_for_additional_flags=ask_for_additional_flags)
+    # Probe and match all the files in the background while the user fills in the template from the first one
+    mkv_files_to_modify = start_background_task(get_matching_files_from_directory, directory)
+    edit_mkv_tracks_properties(mkv_files_to_modify, force_language_prompt=force_language_prompt, ask_for_additional_flags=ask_for_additional_flags, max_workers=max_workers, first_file_path=video_files[0])
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(prog='mkvrearrange', description="Rearrange and set the flags of the tracks in all the similar MKV files in the directory.")
     parser.add_argument('directory', nargs='?', default=os.getcwd(), help='Directory to process')
     parser.add_argument('-l', '--force-language-prompt', action='store_true', help='Forces the program to prompt the user to input languages for each track.')
     parser.add_argument('-a', '--prompt-additional-tags', action='store_true', help='Forces the program to prompt the user to input all optional tags for each track.')
+    parser.add_argument('-w', '--workers', type=int, default=EDIT_WORKERS, help='Number of files to edit at the same time.')
     
     args = parser.parse_args()
     main(args)
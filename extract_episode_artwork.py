@@ -1,83 +1,255 @@
 import os
 import argparse
-import urllib.request
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from utils.file_management_helpers import *
 from utils.plex_server_utilities import *
+from utils.cache_helpers import get_file_identity, load_json_cache, save_json_cache
+from utils.image_helpers import IMAGE_FORMATS, DEFAULT_IMAGE_QUALITY, get_image_extension, resize_and_encode_image
+
+# Number of artworks downloaded at the same time (bounded by the connection pool of the Plex session)
+ARTWORK_WORKERS = 8
+
+# Name of the on-disk store of the artworks that were already downloaded, used to skip unchanged artworks
+ARTWORK_CACHE_NAME = 'artwork_cache.json'
+
+# Key of the Plex endpoint that resizes images on the server, so only the resized artwork is transferred
+PHOTO_TRANSCODE_KEY = '/photo/:/transcode'
+
+# The photo transcoder needs both dimensions, so this is used for the one that is not limited
+MAX_ARTWORK_DIMENSION = 10000
+
+# Size and encoding of the saved artwork; when not given, the original artwork is saved as it is. The quality is
+# None unless it was given, in which case artwork the server already resized is re-encoded with it as well
+ArtworkFormat = namedtuple('ArtworkFormat', ['width', 'height', 'image_format', 'quality'])
+
+def download_original_or_resized_artwork(thumb, output_path, artwork_format=None, etag=None, skip_same_size=False):
+    """Download the artwork, resized by the Plex photo transcoder when a size is requested, and return the response headers and whether it still needs to be processed locally.
+
+    An artwork the server resized into the requested format is saved as it is, unless a quality was
+    given to re-encode it with. If the server cannot transcode the artwork, the original is downloaded
+    so it can be resized locally.
+    """
+    if artwork_format and (artwork_format.width or artwork_format.height):
+        from requests.exceptions import HTTPError
+        params = {
+            'url': thumb,
+            'width': artwork_format.width or MAX_ARTWORK_DIMENSION,
+            'height': artwork_format.height or MAX_ARTWORK_DIMENSION,
+            'minSize': 0,
+            'upscale': 0,
+        }
+        try:
+            headers = download_plex_file(PHOTO_TRANSCODE_KEY, output_path, params=params, etag=etag)
+        except HTTPError as e:
+            print(f'Plex could not resize the artwork for "{os.path.basename(output_path)}" ({e}). Resizing it locally instead.')
+        else:
+            # Only re-encode the resized artwork when the server returned it in another format or a quality was given
+            content_type = headers.get('Content-Type', '').split(';')[0].strip() if headers is not None else None
+            return headers, content_type != f'image/{artwork_format.image_format}' or artwork_format.quality is not None
+    headers = download_plex_file(thumb, output_path, etag=etag, skip_same_size=skip_same_size)
+    return headers, artwork_format is not None
+
+def download_artwork(thumb, output_path, cache_entry=None, artwork_format=None):
+    """Download the artwork unless the local file already matches it and return the new cache entry, whether it was downloaded, and whether it still needs to be processed.
+
+    The thumb key contains the version of the artwork, so a local file that has not changed since the same
+    thumb was downloaded with the same format is skipped without any request. Otherwise the download is
+    conditional on the stored ETag, and original artworks that are already the same size as the local
+    file are not transferred again.
+    """
+    settings = list(artwork_format) if artwork_format else None
+    try:
+        identity = get_file_identity(output_path)
+    except OSError:
+        identity = None
+    if identity is None or (cache_entry and cache_entry.get('settings') != settings):
+        cache_entry = None
+    elif cache_entry and cache_entry['thumb'] == thumb and cache_entry['identity'] == identity:
+        return cache_entry, False, False
+
+    etag = cache_entry.get('etag') if cache_entry else None
+    headers, needs_processing = download_original_or_resized_artwork(thumb, output_path, artwork_format=artwork_format, etag=etag, skip_same_size=identity is not None and not artwork_format)
+    if headers is None:
+        return {'thumb': thumb, 'etag': etag, 'identity': identity, 'settings': settings}, False, False
+    return {'thumb': thumb, 'etag': headers.get('ETag'), 'identity': get_file_identity(output_path), 'settings': settings}, True, needs_processing
+
+def download_artworks(artworks, max_workers=ARTWORK_WORKERS, artwork_format=None):
+    """Concurrently download a list of (thumb, output path) pairs, skipping the artworks that are already up to date.
+
+    With an artwork format, every downloaded artwork that the server did not already resize into the format
+    is then shrunk if needed and re-encoded in a pool of processes while the remaining artworks are still
+    downloading.
+    """
+    cache = load_json_cache(ARTWORK_CACHE_NAME, default={})
+
+    # The image processes are started while the download threads are running, and forking a process that
+    # has running threads can deadlock it, so the processes are spawned instead
+    process_context = multiprocessing.get_context('spawn')
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, ProcessPoolExecutor(max_workers=max_workers if artwork_format else 1, mp_context=process_context) as process_executor:
+        download_futures = {}
+        for thumb, output_path in artworks:
+            key = os.path.abspath(output_path)
+            download_futures[executor.submit(download_artwork, thumb, output_path, cache.get(key), artwork_format)] = output_path
+
+        process_futures = {}
+        while download_futures or process_futures:
+            done, _ = wait(list(download_futures) + list(process_futures), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in download_futures:
+                    output_path = download_futures.pop(future)
+                    try:
+                        cache_entry, was_downloaded, needs_processing = future.result()
+                    except Exception as e:
+                        print(f'Could not download the artwork for "{os.path.basename(output_path)}": {e}')
+                        continue
+
+                    if not was_downloaded:
+                        cache[os.path.abspath(output_path)] = cache_entry
+                        print(f'Artwork already up to date: {os.path.basename(output_path)}')
+                    elif needs_processing:
+                        process_future = process_executor.submit(resize_and_encode_image, output_path, artwork_format.width, artwork_format.height, artwork_format.image_format, DEFAULT_IMAGE_QUALITY if artwork_format.quality is None else artwork_format.quality)
+                        process_futures[process_future] = (output_path, cache_entry)
+                    else:
+                        cache[os.path.abspath(output_path)] = cache_entry
+                        print(f'Artwork saved as: {os.path.basename(output_path)}')
+                else:
+                    output_path, cache_entry = process_futures.pop(future)
+                    try:
+                        width, height = future.result()
+                    except Exception as e:
+                        print(f'Could not process the artwork "{os.path.basename(output_path)}": {e}')
+                        continue
+
+                    # The processed file is what later runs compare against
+                    cache_entry['identity'] = get_file_identity(output_path)
+                    cache[os.path.abspath(output_path)] = cache_entry
+                    print(f'Artwork saved as: {os.path.basename(output_path)} ({width}x{height})')
+
+    save_json_cache(ARTWORK_CACHE_NAME, cache)
+
+def get_episode_items(plex_agent, file_paths):
+    """Return a dictionary of each file path to its Plex episode.
+
+    Every show is only resolved once and all of its episodes, including their thumbs, are listed in a
+    single request, so files of the same show do not need requests of their own.
+    """
+    episodes_by_rating_key = {}
+    episode_items = {}
+    for file_path in file_paths:
+        rating_key = plex_agent.index.get_rating_key(file_path)
+        episode = episodes_by_rating_key.get(rating_key)
+        if episode is None:
+            item = plex_agent.get_plex_item(file_path)
+            if item is None or item.type != 'episode':
+                print(f'Could not find "{os.path.basename(file_path)}" in Plex.')
+                continue
+            show_item = plex_agent.plex.fetchItem(item.grandparentRatingKey)
+            for show_episode in show_item.episodes():
+                episodes_by_rating_key[show_episode.ratingKey] = show_episode
+            episode = episodes_by_rating_key.get(item.ratingKey, item)
+        episode_items[file_path] = episode
+    return episode_items
+
+def get_artwork_extension(artwork_format=None):
+    """Return the file extension of artwork saved in the format."""
+    return get_image_extension(artwork_format.image_format) if artwork_format else '.jpg'
 
 # Iterate through files in the directory
-def extract_episode_artworks(directory):
+def extract_episode_artworks(directory, max_workers=ARTWORK_WORKERS, artwork_format=None):
     # Create a PlexInfo object from which to extract information about each file from Plex
     plex_agent = PlexInfo()
 
     mkv_files = get_video_files_from_directory(directory)
 
-    for file in mkv_files:
+    artworks = []
+    for file, episode_item in get_episode_items(plex_agent, mkv_files).items():
+        if not episode_item.thumb:
+            print(f'No artwork found in Plex for "{os.path.basename(file)}".')
+            continue
         # Create path for the artwork
-        output_path = os.path.splitext(file)[0] + '.jpg'
-
-        plex_info = plex_agent.get_plex_info(file)
-
-        show_search = plex_agent.plex.library.search(plex_info['series'])
-        for result in show_search:
-            if result.title == plex_info['series']:
-                show_item = result
-                break
-
-        episode_item = show_item.season(plex_info['season']).episode(plex_info['episode'])
-        artwork_path = episode_item.thumb
-        artwork_url = f'{PLEX_SERVER_BASE_URL}{artwork_path}?X-Plex-Token={PLEX_ACESS_TOKEN}'
-        urllib.request.urlretrieve(artwork_url, output_path)
-
-        print(f'Artwork saved as: {os.path.basename(output_path)}')
-
-def extract_season_artwork(directory):
+        output_path = os.path.splitext(file)[0] + get_artwork_extension(artwork_format)
+        artworks.append((episode_item.thumb, output_path))
+
+    download_artworks(artworks, max_workers=max_workers, artwork_format=artwork_format)
+
+def get_directory_seasons(plex_agent, file_paths):
+    """Return a dictionary of each directory holding the files to the rating key of the season its episodes belong to.
+
+    Seasons are looked up in the path index, so no requests are made for the individual files.
+    """
+    directory_seasons = {}
+    for file_path in file_paths:
+        directory = os.path.dirname(file_path)
+        if directory in directory_seasons:
+            continue
+        season_rating_key = plex_agent.index.get_season_rating_key(file_path)
+        if season_rating_key is not None:
+            directory_seasons[directory] = season_rating_key
+    return directory_seasons
+
+def extract_season_artwork(directory, artwork_format=None, recursive=False, max_workers=ARTWORK_WORKERS):
+    """Save the artwork of the season in the directory, or of every season in the directory tree when recursive.
+
+    All seasons are fetched from Plex in bulk and their artworks are downloaded concurrently.
+    """
     # Create a PlexInfo object from which to extract information from Plex
     plex_agent = PlexInfo()
 
-    mkv_files = get_video_files_from_directory(directory)
-
-    first_file = mkv_files[0]
-
-    plex_info = plex_agent.get_plex_info(first_file)
+    if recursive:
+        mkv_files = get_video_files_from_directory_and_subdirectories(directory)
+    else:
+        mkv_files = get_video_files_from_directory(directory)
 
-    show_item = None
-    show_search = plex_agent.plex.library.search(plex_info['series'])
-    for result in show_search:
-        if result.title == plex_info['series']:
-            show_item = result
-            break
+    directory_seasons = get_directory_seasons(plex_agent, mkv_files)
+    for season_directory in sorted({os.path.dirname(file) for file in mkv_files} - set(directory_seasons)):
+        print(f'Could not find the episodes in "{season_directory}" in Plex.')
 
-    assert show_item, f"Could not find show {plex_info['series']} in Plex."
+    season_items = fetch_plex_items(directory_seasons.values())
 
-    season_item = show_item.season(plex_info['season'])
-    
-    # Create path for the artwork
-    output_path = os.path.join(directory, f'Season{plex_info["season"]:02}.jpg')
-    artwork_path = season_item.thumb
-    artwork_url = f'{PLEX_SERVER_BASE_URL}{artwork_path}?X-Plex-Token={PLEX_ACESS_TOKEN}'
-    urllib.request.urlretrieve(artwork_url, output_path)
+    artworks = []
+    for season_directory, season_rating_key in sorted(directory_seasons.items()):
+        season_item = season_items.get(season_rating_key)
+        if season_item is None or not season_item.thumb:
+            print(f'No season artwork found in Plex for "{season_directory}".')
+            continue
+        # Create path for the artwork
+        output_path = os.path.join(season_directory, f'Season{season_item.index:02}{get_artwork_extension(artwork_format)}')
+        artworks.append((season_item.thumb, output_path))
 
-    print(f'Artwork saved as: {os.path.basename(output_path)}')
+    download_artworks(artworks, max_workers=max_workers, artwork_format=artwork_format)
 
 def main(args):
     directory = args.directory
     get_season_artwork = args.season
 
-    # Update the Plex libraries
-    plex_update_libraries()
+    # The artwork is only resized and re-encoded if any of the format options are given
+    artwork_format = None
+    if args.width or args.height or args.format or args.quality is not None:
+        artwork_format = ArtworkFormat(args.width, args.height, args.format or 'jpeg', args.quality)
+
+    # Update the Plex libraries holding the directory and wait for the scan, so the artwork is up to date
+    plex_update_libraries([directory])
 
     if get_season_artwork:
         print("Extracting season artwork. . .")
-        extract_season_artwork(directory)
+        extract_season_artwork(directory, artwork_format=artwork_format, recursive=args.recursive, max_workers=args.workers)
     else:
         print("Extracting episode artwork. . .")
-        extract_episode_artworks(directory)
+        extract_episode_artworks(directory, max_workers=args.workers, artwork_format=artwork_format)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(prog='mkvextractsubs', description="Extract all subtitle tracks from the MKV files in a directory.")
     parser.add_argument('directory', nargs='?', default=os.getcwd(), help='Directory to process')
     parser.add_argument('--season', action='store_true', help='Extract season artwork instead of episode artwork')
-    
+    parser.add_argument('-r', '--recursive', action='store_true', help='With --season, extract the artwork of every season in the directory and its subdirectories.')
+    parser.add_argument('-w', '--workers', type=int, default=ARTWORK_WORKERS, help='Number of artworks to download at the same time.')
+    parser.add_argument('--width', type=int, default=None, help='Maximum width of the saved artwork.')
+    parser.add_argument('--height', type=int, default=None, help='Maximum height of the saved artwork.')
+    parser.add_argument('--format', choices=list(IMAGE_FORMATS), default=None, help='Save the artwork as a JPEG or as a WebP. JPEGs re-encoded locally are progressive, while JPEGs resized by the Plex server are saved as the server returns them unless --quality is given.')
+    parser.add_argument('--quality', type=int, default=None, help=f'Quality (0-100) of the artwork re-encoded locally (default: {DEFAULT_IMAGE_QUALITY}). When given, JPEG artwork resized by the Plex server is also re-encoded with it.')
+
     args = parser.parse_args()
 
     main(args)
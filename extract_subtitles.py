@@ -1,88 +1,133 @@
 import os
 import argparse
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from utils.file_management_helpers import *
-
-def extract_subtitles_from_files(mkv_files, language=None):
-    # Process each file
-    for file_path in mkv_files:
-        tracks_info = get_tracks_info(file_path)
-
-        subtitles_tracks_info = [track for track in tracks_info if track['type'] == 'subtitles']
-        if language:
-            subtitles_tracks_info = [track for track in subtitles_tracks_info if track['language'] == language]
-
-        print("Extracting the following subtitles tracks:")
-        list_tracks(subtitles_tracks_info)
-
-        output_paths = [] # Keep track of output paths to avoid overwriting files
-        for track in subtitles_tracks_info:
-            file_extension = get_file_extension(track['codec'])
-            if not file_extension:
-                print(f"Could not find file extension for {track['codec']}, skipping. . .")
+from utils.matroska_helpers import MatroskaError, extract_text_subtitles
+
+# Subtitle codecs (as named by mkvmerge) that are extracted without mkvextract
+NATIVE_SUBTITLE_CODECS = ('SubRip/SRT', 'SubStationAlpha')
+
+# Number of files extracted from at the same time
+EXTRACT_WORKERS = 4
+
+def get_extraction_targets(file_path, tracks_info, track_type, language=None):
+    """Return (track, output path) pairs for every track of the given type (and language) to extract from the file."""
+    selected_tracks_info = [track for track in tracks_info if track['type'] == track_type]
+    if language:
+        selected_tracks_info = [track for track in selected_tracks_info if track['language'] == language]
+
+    print(f"Extracting the following {track_type} tracks from {os.path.basename(file_path)}:")
+    list_tracks(selected_tracks_info)
+
+    targets = []
+    output_paths = [] # Keep track of output paths to avoid overwriting files
+    for track in selected_tracks_info:
+        file_extension = get_file_extension(track['codec'])
+        if not file_extension:
+            print(f"Could not find file extension for {track['codec']}, skipping. . .")
+            continue
+
+        track_language = track['language'] if track['language'] != 'und' else None
+        is_forced = track['forced_track'] and track_type == 'subtitles'
+        track_id = track['id']
+
+        output_path = os.path.splitext(file_path)[0] + (f'.{track_language}' if track_language else '') + ('.forced' if is_forced else '')
+        if (output_path + f'.{file_extension}') in output_paths:
+            output_path += f'.{track_id}'
+        output_path += f'.{file_extension}'
+
+        output_paths.append(output_path)
+        targets.append((track, output_path))
+
+    return targets
+
+def extract_tracks_from_file(file_path, targets):
+    """Extract all the targeted tracks of the file, returning a list of error messages (empty on success).
+
+    Text subtitles of Matroska files are read natively in a single pass over only their blocks, and every
+    other track is extracted with a single mkvextract call so that the file is only read once.
+    """
+    native_targets = [
+        (track, output_path) for track, output_path in targets
+        if track['type'] == 'subtitles' and track['codec'] in NATIVE_SUBTITLE_CODECS and file_path.lower().endswith(NATIVE_PROBE_EXTENSIONS)
+    ]
+    mkvextract_targets = [target for target in targets if target not in native_targets]
+
+    if native_targets:
+        try:
+            extract_text_subtitles(file_path, {track['id']: output_path for track, output_path in native_targets})
+        except (MatroskaError, OSError, ValueError) as e:
+            print(f'Could not extract the text subtitles of "{os.path.basename(file_path)}" natively ({e}). Using mkvextract instead. . .')
+            mkvextract_targets = targets
+
+    if not mkvextract_targets:
+        return []
+
+    command = ['mkvextract', 'tracks', file_path]
+    command += [f'{track["id"]}:{output_path}' for track, output_path in mkvextract_targets]
+    result = subprocess.run(command, capture_output=True, text=True)
+    # mkvextract returns 1 when there were only warnings
+    if result.returncode not in (0, 1):
+        return [result.stdout.strip()]
+    return []
+
+def extract_tracks_from_files(mkv_files, track_type, language=None, max_workers=EXTRACT_WORKERS):
+    """Extract the tracks of the given type from all the files, extracting from several files at the same time."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        # Start extracting from each file as soon as its tracks have been probed
+        for _, probe_result in iter_tracks_info(mkv_files):
+            file_path = probe_result.file_path
+            if probe_result.tracks_info is None:
+                print(f"Error extracting info from {file_path}: {probe_result.error}. Skipping. . .")
                 continue
 
-            track_language = track['language'] if track['language'] != 'und' else None
-            is_forced = track['forced_track']
-            track_id = track['id']
-
-            output_path = os.path.splitext(file_path)[0] + (f'.{track_language}' if track_language else '') + ('.forced' if is_forced else '')
-            if (output_path + f'.{file_extension}') in output_paths:
-                output_path += f'.{track_id}'
-            output_path += f'.{file_extension}'
-            
-            output_paths.append(output_path)
-
-            command = f'mkvextract tracks "{file_path}" {track_id}:"{output_path}"'
-            subprocess.run(command, shell=True)
+            targets = get_extraction_targets(file_path, probe_result.tracks_info, track_type, language=language)
+            if targets:
+                futures[executor.submit(extract_tracks_from_file, file_path, targets)] = file_path
 
-    print("Finished extracting subtitles from files.")
-
-def extract_audio_from_files(mkv_files, language=None):
-    # Process each file
-    for file_path in mkv_files:
-        tracks_info = get_tracks_info(file_path)
-
-        subtitles_tracks_info = [track for track in tracks_info if track['type'] == 'audio']
-        if language:
-            subtitles_tracks_info = [track for track in subtitles_tracks_info if track['language'] == language]
-
-        print("Extracting the following audio tracks:")
-        list_tracks(subtitles_tracks_info)
-
-        for track in subtitles_tracks_info:
-            file_extension = get_file_extension(track['codec'])
-            if not file_extension:
-                print(f"Could not find file extension for {track['codec']}, skipping. . .")
-                continue
+        for future in as_completed(futures):
+            file_path = futures[future]
+            errors = future.result()
+            if not errors:
+                print(f'Extracted {track_type} from "{os.path.basename(file_path)}"')
+            else:
+                print(f'Could not extract {track_type} from "{os.path.basename(file_path)}":')
+                for error in errors:
+                    print(error)
 
-            track_language = track['language'] if track['language'] != 'und' else None
-            output_path = os.path.splitext(file_path)[0] + (('.' + track_language) if track_language else '') + ('.' + file_extension)
-            track_id = track['id']
+    print(f"Finished extracting {track_type} from files.")
 
-            command = f'mkvextract tracks "{file_path}" {track_id}:"{output_path}"'
-            subprocess.run(command, shell=True)
+def extract_subtitles_from_files(mkv_files, language=None, max_workers=EXTRACT_WORKERS):
+    extract_tracks_from_files(mkv_files, 'subtitles', language=language, max_workers=max_workers)
 
-    print("Finished extracting subtitles from files.")
+def extract_audio_from_files(mkv_files, language=None, max_workers=EXTRACT_WORKERS):
+    extract_tracks_from_files(mkv_files, 'audio', language=language, max_workers=max_workers)
 
 def main(args):
     directory = args.directory
     track_type = args.track_type
     language = args.language
+    max_workers = args.workers
     
     if language == 'und':
         language = None
+    else:
+        # Compare against the codes mkvmerge reports (e.g. 'ger' for 'de' or 'deu')
+        language = normalize_language_code(language)
 
     mkv_files_from_which_to_extract = get_video_files_from_directory(directory)
     if track_type == 'subtitles':
-        extract_subtitles_from_files(mkv_files_from_which_to_extract, language=language)
+        extract_subtitles_from_files(mkv_files_from_which_to_extract, language=language, max_workers=max_workers)
     elif track_type == 'audio':
-        extract_audio_from_files(mkv_files_from_which_to_extract, language=language)
+        extract_audio_from_files(mkv_files_from_which_to_extract, language=language, max_workers=max_workers)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(prog='mkvextractsubs', description="Extract all subtitle tracks from the MKV files in a directory.")
     parser.add_argument('directory', nargs='?', default=os.getcwd(), help='Directory to process')
     parser.add_argument('--track-type', choices=['subtitles', 'audio'], default='subtitles', help='Type of tracks to extract (subtitles or audio)')
+    parser.add_argument('-w', '--workers', type=int, default=EXTRACT_WORKERS, help='Number of files to extract tracks from at the same time.')
     parser.add_argument('--language', default='und', help='Language of tracks to extract (3-letter ISO 639-2 code)', type=str)
     
     args = parser.parse_args()
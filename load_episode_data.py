@@ -3,9 +3,15 @@ import json
 import argparse
 from utils.plex_server_utilities import PlexInfo
 from utils.plex_server_utilities import plex_update_libraries
+from utils.plex_server_utilities import apply_plex_edits, get_episode_metadata_edits
 from utils.file_management_helpers import *
 
 def update_episode_data(directory, json_file, do_recursive=False):
+    """Restore the saved episode information of every episode in the directory in bulk.
+
+    All episodes are fetched from Plex at once, episodes that already match the saved information are
+    skipped, and the rest are edited without reloading them.
+    """
     plex_info = PlexInfo()
     
     # Load episode info from JSON file
@@ -17,6 +23,7 @@ def update_episode_data(directory, json_file, do_recursive=False):
     else:
         mkv_files = get_video_files_from_directory(directory)
     
+    files_episode_info = {}
     for file in mkv_files:
         episode_number = get_episode_number_from_string(os.path.basename(file))
         if episode_number is None:
@@ -25,27 +32,26 @@ def update_episode_data(directory, json_file, do_recursive=False):
             episode_string = f'{episode_number}'
             
         if episode_string in episode_data:
+            files_episode_info[file] = episode_data[episode_string]
+
+    episodes = plex_info.get_plex_items(list(files_episode_info))
+
+    item_edits = []
+    for file, episode_info in files_episode_info.items():
+        episode = episodes.get(file)
+        if episode is None or episode.type != 'episode':
+            print(f"Could not find {os.path.basename(file)} in Plex.")
+            continue
+
+        edits = get_episode_metadata_edits(episode, episode_info)
+        if edits:
             print(f"Updating Plex info for {os.path.basename(file)}")
-            update_plex_info(file, episode_data[episode_string], plex_info)
+            item_edits.append((episode, edits))
+        else:
+            print(f"Plex info already up to date for {os.path.basename(file)}")
 
-def update_plex_info(file_path, episode_info, plex_info):
-    # Retrieve the Plex library and find the episode by file path
-    for section in plex_info.plex.library.sections():
-        for media in section.all():
-            if media.type == 'show':
-                for episode in media.episodes():
-                    for part in episode.iterParts():
-                        if os.path.basename(part.file) == os.path.basename(file_path):
-                            episode.edit(**{
-                                'title.value': episode_info['title'],
-                                'title.locked': 1,
-                                'originallyAvailableAt.value': episode_info['originally_available_at'],
-                                'originallyAvailableAt.locked': 1,
-                                'summary.value': episode_info['summary'],
-                                'summary.locked': 1
-                            })
-                            episode.reload()
-                            print(f"Updated info for: {file_path}")
+    failed_episodes = apply_plex_edits(item_edits)
+    print(f"Updated info for {len(item_edits) - len(failed_episodes)} episode(s).")
 
 def main(args):
     directory = args.directory
@@ -55,8 +61,8 @@ def main(args):
     print("Updating episode information in Plex. . .")
     update_episode_data(directory, json_file, do_recursive=do_recursive)
 
-    # Update the Plex libraries
-    plex_update_libraries()
+    # Update the Plex libraries holding the directory (nothing else is looked up, so there is no need to wait)
+    plex_update_libraries([directory], wait=False)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(prog='updateepisodedata', description="Update episode data in Plex from JSON file.")
@@ -2,16 +2,16 @@ import os
 import re
 import argparse
 import subprocess
-from shutil import copyfile
+from concurrent.futures import Future
 from utils.file_management_helpers import *
 from utils.plex_server_utilities import PlexInfo
-from utils.plex_server_utilities import plex_update_libraries
+from utils.plex_server_utilities import plex_update_libraries, get_plex_errors
 from utils.prompt_helpers import *
+from utils.matroska_helpers import MatroskaError, reorder_track_entries
+from utils.concurrency_helpers import DeviceJob, run_jobs_with_device_limits, DEFAULT_MAX_JOBS, DEVICE_CLASS_LIMITS
+from utils.concurrency_helpers import start_background_task, collect_background_result
 from edit_tracks_properties import update_track_properties
 
-# Global variables
-plex_agent = None
-
 def is_muxable_extension(file_extension):
     file_extension = re.sub(r'\.', '', file_extension).strip()
     # Dictionary mapping codecs to their corresponding file extensions
@@ -166,16 +166,14 @@ def prompt_for_new_tracks_info(list_of_tracks_info, force_language_prompt=False,
 
     return updated_tracks_info
 
-def add_matches_from_second_directory(file_matches, second_directory):
-    # Create a PlexInfo object from which to extract information about each file from Plex
-    plex_agent = PlexInfo()
-
-    # Put the MKV files from the second directory in a dictionary indexed by their episode number
-    print("Matching episodes from the second directory to the primary. . .")
-    second_dir_mkv_files = get_matching_files_from_directory(second_directory)
+def append_second_directory_episodes(file_matches, second_dir_files, plex_infos):
+    """Append to every list of file matches the file of the second directory with the same Plex episode number as its first MKV file."""
+    # Put the files from the second directory in a dictionary indexed by their episode number
     second_dir_dict = {}
-    for file in second_dir_mkv_files:
-        plex_info = plex_agent.get_plex_info(file)
+    for file in second_dir_files:
+        plex_info = plex_infos[file]
+        if plex_info is None:
+            continue
         episode_number = plex_info['episode']
         second_dir_dict[episode_number] = file
 
@@ -183,16 +181,72 @@ def add_matches_from_second_directory(file_matches, second_directory):
     for matches in file_matches:
         for file in matches:
             if file.endswith('.mkv'):
-                plex_info = plex_agent.get_plex_info(file)
+                plex_info = plex_infos[file]
+                if plex_info is None:
+                    raise ValueError(f"{os.path.basename(file)} is not in Plex")
                 episode_number = plex_info['episode']
-                matching_episode = second_dir_dict[episode_number]
-                matches.append(matching_episode)
+                if episode_number not in second_dir_dict:
+                    raise ValueError(f"no episode {episode_number} in the second directory to match {os.path.basename(file)}")
+                matches.append(second_dir_dict[episode_number])
                 break
 
     return file_matches
 
-def mux_files(file_paths, tracks_info, output_path, attachments=[]):
-    """Remux the files to reorder tracks using mkvmerge."""
+def get_second_directory_plex_infos(file_matches, second_dir_files):
+    """Start looking up in Plex the episodes of the second directory files and of the first MKV file of every match, in one batch."""
+    # Create a PlexInfo object from which to extract information about each file from Plex
+    plex_agent = PlexInfo()
+    main_mkv_files = [[file for file in matches if file.endswith('.mkv')][:1] for matches in file_matches]
+    return plex_agent.submit_plex_info_many(second_dir_files + sum(main_mkv_files, []))
+
+def add_matches_from_second_directory(file_matches, second_directory, log=print):
+    log("Matching episodes from the second directory to the primary. . .")
+    # Look the episodes up in Plex while the files of the second directory are probed
+    plex_infos = get_second_directory_plex_infos(file_matches, get_video_files_from_directory(second_directory))
+    second_dir_files = get_matching_files_from_directory(second_directory, log=log)
+    return append_second_directory_episodes(file_matches, second_dir_files or [], plex_infos.result())
+
+def add_first_match_from_second_directory(first_file_matches, second_directory):
+    """Add the matching episode from the second directory to the first file matches without probing the second directory.
+
+    The files of the second directory are only listed, and their track structures are checked when all the
+    matches are found in the background.
+    """
+    second_dir_files = get_video_files_from_directory(second_directory)
+    plex_infos = get_second_directory_plex_infos(first_file_matches, second_dir_files)
+    return append_second_directory_episodes(first_file_matches, second_dir_files, plex_infos.result())
+
+def get_track_properties_options(track, set_additional_flags=False):
+    """Return the mkvmerge options that set the flags, language, and name of a track while it is being muxed."""
+    additional_flags_options = {
+        'flag_original': '--original-flag',
+        'flag_hearing_impaired': '--hearing-impaired-flag',
+        'flag_visual_impaired': '--visual-impaired-flag',
+        'flag_text_descriptions': '--text-descriptions-flag',
+        'flag_commentary': '--commentary-flag'
+    }
+
+    track_id = track['id']
+    options = [
+        '--default-track-flag', f'{track_id}:{"1" if track["default_track"] else "0"}',
+        '--forced-display-flag', f'{track_id}:{"1" if track["forced_track"] else "0"}',
+        '--language', f'{track_id}:{track["language"]}',
+    ]
+
+    # Add the name if present
+    track_name = track['track_name']
+    if track_name and track_name != 'N/A':
+        options += ['--track-name', f'{track_id}:{track_name}']
+
+    # Add additional flags if present
+    if set_additional_flags:
+        for flag_name, option in additional_flags_options.items():
+            options += [option, f'{track_id}:{"1" if track[flag_name] else "0"}']
+
+    return options
+
+def mux_files(file_paths, tracks_info, output_path, attachments=[], set_additional_flags=False, capture_output=False):
+    """Remux the files to reorder tracks and set their properties in a single pass using mkvmerge."""
     # Separate the different types of tracks
     video_tracks_info = [track for track in tracks_info if track['type'] == 'video']
     audio_tracks_info = [track for track in tracks_info if track['type'] == 'audio']
@@ -201,12 +255,12 @@ def mux_files(file_paths, tracks_info, output_path, attachments=[]):
     # Comma-separated IDs for the track order argument
     track_order_ids = ','.join(f'{track["file_id"]}:{track["id"]}' for track in tracks_info)
     
-    command = f'mkvmerge --track-order {track_order_ids}'
+    command = ['mkvmerge', '--track-order', track_order_ids]
 
     for attachment in attachments:
-        command += f' --attach-file "{attachment}"'
+        command += ['--attach-file', attachment]
 
-    command += f' -o "{output_path}"'
+    command += ['-o', output_path]
 
     for file_id, file_path in enumerate(file_paths):
         # Comma-separated IDs for the tracks command arguments
@@ -216,28 +270,34 @@ def mux_files(file_paths, tracks_info, output_path, attachments=[]):
 
         # Append arguments to the command for each file
         if video_tracks_ids:
-            command += f' --video-tracks {video_tracks_ids}'
+            command += ['--video-tracks', video_tracks_ids]
         else:
-            command += f' --no-video'
+            command += ['--no-video']
         if audio_tracks_ids:
-            command += f' --audio-tracks {audio_tracks_ids}'
+            command += ['--audio-tracks', audio_tracks_ids]
             for track in audio_tracks_info:
                 if track['file_id'] == file_id and track["track_delay"] != 0:
-                    command += f' --sync {track["id"]}:{track["track_delay"]}'
+                    command += ['--sync', f'{track["id"]}:{track["track_delay"]}']
         else:
-            command += f' --no-audio'
+            command += ['--no-audio']
         if subtitles_tracks_ids:
-            command += f' --subtitle-tracks {subtitles_tracks_ids}'
+            command += ['--subtitle-tracks', subtitles_tracks_ids]
             for track in subtitles_tracks_info:
                 if track['file_id'] == file_id and track["track_delay"] != 0:
-                    command += f' --sync {track["id"]}:{track["track_delay"]}'
+                    command += ['--sync', f'{track["id"]}:{track["track_delay"]}']
         else:
-            command += f' --no-subtitles'
-        # command += f' --chapter-sync {subtitles_delay}'
-        command += f' "{file_path}"'
+            command += ['--no-subtitles']
+
+        # Set the properties of the kept tracks so that the output does not need to be edited afterwards
+        for track in tracks_info:
+            if track['file_id'] == file_id:
+                command += get_track_properties_options(track, set_additional_flags=set_additional_flags)
+
+        # command += ['--chapter-sync', subtitles_delay]
+        command.append(file_path)
     
     # Run the command
-    subprocess.run(command, shell=True)
+    return subprocess.run(command, capture_output=capture_output, text=True)
 
 def get_font_attachments(directory):
     font_attchments = []
@@ -246,15 +306,105 @@ def get_font_attachments(directory):
             font_attchments.append(os.path.join(directory, file))
     return font_attchments
 
-def mux_files_into_mkv(file_matches, attachments=[], force_language_prompt=False, ask_for_additional_flags=False, ask_for_delays=False):
-    first_matching_files = file_matches[0]
+def get_header_only_track_order(file_paths, tracks_template, source_tracks_info, attachments=[]):
+    """Return the new order of the source file's track IDs if the template only reorders and edits its tracks.
+
+    Returns None when the template adds, drops, or delays tracks or when there are attachments to add,
+    in which case the files have to be remuxed.
+    """
+    if not source_tracks_info or attachments or not file_paths[0].lower().endswith('.mkv'):
+        return None
+    if any(track['file_id'] != 0 or track['track_delay'] != 0 for track in tracks_template):
+        return None
+
+    track_order = [track['id'] for track in tracks_template]
+    if sorted(track_order) != sorted(track['id'] for track in source_tracks_info):
+        return None
+    return track_order
+
+def check_mkvtoolnix_result(result, file_path):
+    """Raise an error with the tool's output if an MKVToolNix tool failed (it returns 1 for warnings and 2 for errors)."""
+    if result.returncode >= 2:
+        output = (result.stdout or '').strip().splitlines()
+        raise RuntimeError(f'{result.args[0]} failed for "{os.path.basename(file_path)}"' + (f': {output[-1]}' if output else ''))
+
+def get_remux_output_path(file_paths):
+    """Return the path in the remux folder where the file produced from the matching files is written."""
+    for file_path in file_paths:
+        if file_path.lower().endswith(('.mkv', '.mp4', '.avi')):
+            main_file_path = file_path
+            break # break here because the primary video file should be listed before other video files.
+    return os.path.join(os.path.dirname(main_file_path), 'remux', os.path.basename(main_file_path))
+
+def remux_matching_files(file_paths, tracks_template, source_tracks_info, attachments=[], set_additional_flags=False, in_place=False, capture_output=False):
+    """Produce the file for one match of files, rewriting only the header of the main file whenever possible."""
+    # Determine the new output path for remuxed files
+    output_path = get_remux_output_path(file_paths)
+    new_dir = os.path.dirname(output_path)
+
+    # Check if remuxing is needed
+    if source_tracks_info is None or (get_identifying_info_from_tracks_info(tracks_template) != get_identifying_info_from_tracks_info(source_tracks_info)):
+        # If the tracks are only reordered, rearrange the track entries of the header instead of remuxing
+        track_order = get_header_only_track_order(file_paths, tracks_template, source_tracks_info, attachments=attachments)
+        if track_order is not None:
+            if in_place:
+                edited_path = file_paths[0]
+            else:
+                os.makedirs(new_dir, exist_ok=True)
+                clone_or_copy_file(file_paths[0], output_path)
+                edited_path = output_path
+            try:
+                reorder_track_entries(edited_path, track_order)
+                result = update_track_properties(edited_path, tracks_template, set_additional_flags=set_additional_flags, capture_output=capture_output)
+                check_mkvtoolnix_result(result, edited_path)
+                return
+            except MatroskaError as e:
+                print(f'Could not reorder the tracks of "{os.path.basename(edited_path)}" in place ({e}). Remuxing instead. . .')
+
+        # The track properties are written while muxing
+        os.makedirs(new_dir, exist_ok=True)
+        result = mux_files(file_paths, tracks_template, output_path, attachments=attachments, set_additional_flags=set_additional_flags, capture_output=capture_output)
+        check_mkvtoolnix_result(result, output_path)
+    elif in_place:
+        # If no reordering is needed, only update the track properties
+        result = update_track_properties(file_paths[0], tracks_template, set_additional_flags=set_additional_flags, capture_output=capture_output)
+        check_mkvtoolnix_result(result, file_paths[0])
+    else:
+        # If no reordering is needed, just copy the file and update its track properties
+        os.makedirs(new_dir, exist_ok=True)
+        clone_or_copy_file(file_paths[0], output_path)
+        result = update_track_properties(output_path, tracks_template, set_additional_flags=set_additional_flags, capture_output=capture_output)
+        check_mkvtoolnix_result(result, output_path)
+
+def probe_first_files_of_matches(file_matches, log=print):
+    """Return the file matches, waiting for them if they are still being found in the background, and the probe results of the first file of every match."""
+    if isinstance(file_matches, Future):
+        file_matches = collect_background_result(file_matches, log=log)
+    if not file_matches:
+        return None, None
+    return file_matches, probe_tracks_info([file_paths[0] for file_paths in file_matches])
+
+def mux_files_into_mkv(file_matches, attachments=[], force_language_prompt=False, ask_for_additional_flags=False, ask_for_delays=False, in_place=False, max_jobs=DEFAULT_MAX_JOBS, device_class_limits=DEVICE_CLASS_LIMITS, first_matching_files=None):
+    """Prompt the user for a template from the first matching files and remux every match to it.
+
+    The file matches can also be a future from start_background_task that is still finding them, in which
+    case the first matching files must be given. Either way, the files are probed in the background while
+    the user is prompted, so the remuxing starts as soon as the template is confirmed.
+    """
+    if first_matching_files is None:
+        first_matching_files = file_matches[0]
 
     # This is a list of tracks info for all the tracks to merge
     first_matching_files_tracks_infos = []
 
-    for file_id, file in enumerate(first_matching_files):
-        tracks_info = get_tracks_info(file, file_id=file_id)
-        first_matching_files_tracks_infos.append(tracks_info)
+    for probe_result in probe_tracks_info(first_matching_files, file_ids=list(range(len(first_matching_files)))):
+        if probe_result.tracks_info is None:
+            print(f"Error reading tracks info from {probe_result.file_path}: {probe_result.error}. Aborting.")
+            return
+        first_matching_files_tracks_infos.append(probe_result.tracks_info)
+
+    # Probe the first file of every match in the background to check which files need remuxing
+    preparation = start_background_task(probe_first_files_of_matches, file_matches)
     
     # Prompt the user to give the new order and default/forced status for the tracks
     tracks_template = prompt_for_new_tracks_info(
@@ -273,26 +423,27 @@ def mux_files_into_mkv(file_matches, attachments=[], force_language_prompt=False
         print("Aborting. . .")
         return
 
-    # Process each file
-    for file_paths in file_matches:
-        # Determine the new output path for remuxed files
-        for file_path in file_paths:
-            if file_path.lower().endswith(('.mkv', '.mp4', '.avi')):
-                main_file_path = file_path
-                break # break here because the primary video file should be listed before other video files.
-        new_dir = os.path.join(os.path.dirname(main_file_path), 'remux')
-        os.makedirs(new_dir, exist_ok=True)
-        output_path = os.path.join(new_dir, os.path.basename(main_file_path))
-        
-        # Check if remuxing is needed
-        if (get_identifying_info_from_tracks_info(tracks_template) != get_identifying_info_from_tracks_info(get_tracks_info(file_paths[0]))):
-            mux_files(file_paths, tracks_template, output_path, attachments=attachments)
-        else:
-            # If no reordering is needed, just copy the file
-            copyfile(file_paths[0], output_path)
+    # Wait for the matching and probing that ran while the user was prompted
+    try:
+        file_matches, probe_results = collect_background_result(preparation)
+    except Exception as e:
+        print(f"Could not find the files to process: {e}. Aborting.")
+        return
+    if not file_matches:
+        print("No files found to process. Aborting.")
+        return
 
-        # Update track properties
-        update_track_properties(output_path, tracks_template, set_additional_flags=ask_for_additional_flags)
+    # Process the files concurrently, limiting how many jobs read from or write to each device at once
+    jobs = []
+    for file_paths, probe_result in zip(file_matches, probe_results):
+        output_path = file_paths[0] if in_place else get_remux_output_path(file_paths)
+        jobs.append(DeviceJob(
+            remux_matching_files,
+            (file_paths, tracks_template, probe_result.tracks_info, attachments, ask_for_additional_flags, in_place, True),
+            file_paths + [output_path],
+            os.path.basename(output_path),
+        ))
+    run_jobs_with_device_limits(jobs, device_class_limits=device_class_limits, max_jobs=max_jobs)
 
     print("Finished remuxing files.")
 
@@ -317,89 +468,134 @@ def string_to_match_name(string_to_convert):
 
     return match_name
 
-def get_tracks_to_mux(main_files):
+def index_directory_for_matching(directory):
+    """Scan the directory tree once and index its entries for matching files to main files.
+
+    Returns a dictionary with the muxable files of the directory by match name, the subdirectories
+    anywhere in the tree by match name, and the files of every subdirectory.
+    """
+    directory_index = {
+        'files_by_match_name': {},
+        'directories_by_match_name': {},
+        'directory_files': {},
+    }
+
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            # Check if the file is muxable
+            if not entry.is_file() or not is_muxable_extension(os.path.splitext(entry.name)[1]):
+                continue
+            match_name = path_to_match_name(entry.name)
+            directory_index['files_by_match_name'].setdefault(match_name, []).append(entry.path)
+
+    # Index the subdirectories in the same order as os.walk would visit them. Symbolic links to directories are
+    # indexed and their files listed like os.walk does, but, also like os.walk, the scan does not descend into them,
+    # so a link loop cannot make it run forever
+    directories_to_scan = [directory]
+    while directories_to_scan:
+        current_directory = directories_to_scan.pop(0)
+        subdirectories = []
+        with os.scandir(current_directory) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    directory_index['directories_by_match_name'].setdefault(string_to_match_name(entry.name), []).append(entry.path)
+                    if not entry.is_symlink():
+                        subdirectories.append(entry.path)
+                        continue
+                    with os.scandir(entry.path) as linked_entries:
+                        directory_index['directory_files'][entry.path] = [linked_entry.path for linked_entry in linked_entries if not linked_entry.is_dir()]
+                elif current_directory != directory:
+                    directory_index['directory_files'].setdefault(current_directory, []).append(entry.path)
+        directories_to_scan = subdirectories + directories_to_scan
+
+    return directory_index
+
+def get_tracks_to_mux(main_files, log=print):
     """Return a list of lists of files that should be muxed together."""
     file_matches = []
+    directory_indexes = {}
     for file in main_files:
         directory = os.path.dirname(file)
+        if directory not in directory_indexes:
+            directory_indexes[directory] = index_directory_for_matching(directory)
+        directory_index = directory_indexes[directory]
 
         # Get a "match name" for the file which consists of its base name without the extension and any extra tags
         match_name = path_to_match_name(file)
 
-        # Check if the file exists in Plex and get the episode number
-        try:
-            plex_info = plex_agent.get_plex_info(file)
-            if plex_info:
-                episode_number = int(plex_info['episode'])
-            else:
-                episode_number = None
-        except:
-            episode_number = None
+        # Find the files in the directory with the same match name as the main file
+        matching_files = list(directory_index['files_by_match_name'].get(match_name, []))
 
-        matching_files = []
-
-        # Loop through the files in the directory of the current file to find matches
-        for other_file in os.listdir(directory):
-            # Check if the file is muxable
-            file_extension = os.path.splitext(other_file)[1]
-            if is_muxable_extension(file_extension):
-                # Check if the match name is the same as the main file
-                other_file_match_name = path_to_match_name(other_file)
-                if other_file_match_name == match_name:
-                    matching_files.append(os.path.join(directory, other_file))
-                    continue
-
-                # Check if the episode number is the same as the main file
-                if episode_number:
-                    other_file_episode_number = get_episode_number_from_string(other_file_match_name)
-                    if other_file_episode_number == episode_number:
-                        matching_files.append(os.path.join(directory, other_file))
-                        continue
-
-        # Check all subdirectories for directories with the same name as the match name
-        for root, dirs, files in os.walk(directory):
-            for dir in dirs:
-                if string_to_match_name(dir) == match_name:
-                    # Append all files in the folder to the matching_files list
-                    for file in os.listdir(os.path.join(root, dir)):
-                        matching_files.append(os.path.join(root, dir, file))
+        # Append all files in subdirectories with the same name as the match name
+        for matching_directory in directory_index['directories_by_match_name'].get(match_name, []):
+            matching_files += directory_index['directory_files'].get(matching_directory, [])
 
         file_matches.append(matching_files)
 
     # Verify that the matching_files lists are all the same length
     for matching_files in file_matches:
         if len(matching_files) != len(file_matches[0]):
-            print("Error: The file matches lists are not all the same length.")
+            log("Error: The file matches lists are not all the same length.")
             return
-    print(f'Found {len(file_matches[0])} matching files for each main file.')
+    log(f'Found {len(file_matches[0])} matching files for each main file.')
     
     return file_matches
 
+def get_file_matches(main_files, second_directory=None, log=print):
+    """Return the lists of files to mux together for the main files, including the matching episodes from the second directory."""
+    file_matches = get_tracks_to_mux(main_files, log=log)
+    if file_matches and second_directory:
+        file_matches = add_matches_from_second_directory(file_matches, second_directory, log=log)
+    return file_matches
+
+def find_file_matches(directory, second_directory=None, log=print):
+    """Find the main files of the directory with the same track structure and return the lists of files to mux together."""
+    main_files = get_matching_files_from_directory(directory, log=log)
+    if not main_files:
+        return None
+    return get_file_matches(main_files, second_directory=second_directory, log=log)
+
 def main(args):
     directory = args.directory
     second_directory = args.second_directory
     force_language_prompt = args.force_language_prompt
     ask_for_additional_flags = args.prompt_additional_tags
     ask_for_delays = args.add_delays
-
-    # Update the Plex libraries
+    in_place = args.in_place
+    max_jobs = args.jobs
+    device_class_limits = {
+        'rotational': args.hdd_jobs,
+        'solid_state': args.ssd_jobs,
+        'other': args.other_jobs,
+    }
+
+    # Update the Plex libraries, only waiting for the scan when the episodes of the second directory are looked up in Plex
     try:
-        plex_agent = PlexInfo()
-        plex_update_libraries()
-    except:
-        print("Could not connect to Plex server to update libraries. Continuing without updating.")
+        plex_update_libraries([directory] + ([second_directory] if second_directory else []), wait=bool(second_directory))
+    except get_plex_errors() as e:
+        print(f"Could not connect to Plex server to update libraries: {e}. Continuing without updating.")
 
-    main_files = get_matching_files_from_directory(directory)
-    if not main_files or len(main_files) < 1:
+    video_files = get_video_files_from_directory(directory)
+    if not video_files:
         print("No files found to process. Aborting.")
         return
-    file_matches = get_tracks_to_mux(main_files)
-    attachments = get_font_attachments(directory)
 
+    # Only the files matching the first main file are needed for the template, so the rest are probed and matched
+    # in the background while the user is prompted
+    first_file_matches = get_tracks_to_mux(video_files[:1])
+    if not first_file_matches:
+        print("No files found to process. Aborting.")
+        return
     if second_directory:
-        file_matches = add_matches_from_second_directory(file_matches, second_directory)
+        try:
+            first_file_matches = add_first_match_from_second_directory(first_file_matches, second_directory)
+        except get_plex_errors() as e:
+            print(f"Could not match the first file to the second directory: {e}. Aborting.")
+            return
+    file_matches = start_background_task(find_file_matches, directory, second_directory=second_directory)
+    attachments = get_font_attachments(directory)
 
-    mux_files_into_mkv(file_matches, attachments=attachments, force_language_prompt=force_language_prompt, ask_for_additional_flags=ask_for_additional_flags, ask_for_delays=ask_for_delays)
+    mux_files_into_mkv(file_matches, attachments=attachments, force_language_prompt=force_language_prompt, ask_for_additional_flags=ask_for_additional_flags, ask_for_delays=ask_for_delays, in_place=in_place, max_jobs=max_jobs, device_class_limits=device_class_limits, first_matching_files=first_file_matches[0])
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(prog='mkvrearrange', description="Rearrange and set the flags of the tracks in all the similar MKV files in the directory.")
@@ -407,7 +603,12 @@ if __name__ == "__main__":
     parser.add_argument('-d2', '--second-directory', default=None, help='Directory of numbered MKV files to merge')
     parser.add_argument('-l', '--force-language-prompt', action='store_true', help='Forces the program to prompt the user to input languages for each track.')
     parser.add_argument('-a', '--prompt-additional-tags', action='store_true', help='Forces the program to prompt the user to input all optional tags for each track.')
+    parser.add_argument('-i', '--in-place', action='store_true', help='When tracks are only reordered or their properties changed, edit the original files instead of writing copies to the remux folder. This is the fast path: without it every file is copied before it is edited, which only avoids rewriting the whole file on copy-on-write file systems such as Btrfs or XFS.')
     parser.add_argument('-d', '--add-delays', action='store_true', help='Prompt the user to input delays for subtitle and audio tracks. Accepts positive and negative numbers of milliseconds.')
+    parser.add_argument('-j', '--jobs', type=int, default=DEFAULT_MAX_JOBS, help='Maximum number of files to remux at the same time.')
+    parser.add_argument('--hdd-jobs', type=int, default=DEVICE_CLASS_LIMITS['rotational'], help='Maximum number of files remuxed at the same time from or to the same hard drive.')
+    parser.add_argument('--ssd-jobs', type=int, default=DEVICE_CLASS_LIMITS['solid_state'], help='Maximum number of files remuxed at the same time from or to the same solid state drive.')
+    parser.add_argument('--other-jobs', type=int, default=DEVICE_CLASS_LIMITS['other'], help='Maximum number of files remuxed at the same time from or to the same network share or other device.')
     
     args = parser.parse_args()
     main(args)
@@ -153,13 +153,20 @@ def get_files_information(directory, do_recursive=False):
     if not video_files_to_rename:
         return None
 
+    # From Plex, grab the episode number, season number, and title of all the files in the background
+    plex_infos_future = plex_agent.submit_plex_info_many(video_files_to_rename)
+
+    # Meanwhile, using mkvmerge, grab the video codec and resolution of all the files at once
+    probe_results = probe_tracks_info(video_files_to_rename)
+    plex_infos = plex_infos_future.result()
+
     video_files_info = []
-    for filepath in video_files_to_rename:
-        # From Plex, grab the episode number, season number, and title
-        plex_info = plex_agent.get_plex_info(filepath)
-        # Using mkvmerge, grab the video codec and resolution
-        tracks_info = get_tracks_info(filepath)
-        video_track_info = [track for track in tracks_info if track['type'] == 'video'][0]
+    for filepath, probe_result in zip(video_files_to_rename, probe_results):
+        if probe_result.tracks_info is None:
+            print(f"Error extracting info from {filepath}: {probe_result.error}. Skipping. . .")
+            continue
+        plex_info = plex_infos[filepath]
+        video_track_info = [track for track in probe_result.tracks_info if track['type'] == 'video'][0]
 
         try:
             file_info = {
@@ -185,8 +192,8 @@ def main(args):
     directory = args.directory
     do_recursive = args.recursive
 
-    # Update the Plex libraries
-    plex_update_libraries()
+    # Update the Plex libraries holding the directory and wait for the scan, so the files are known to Plex
+    plex_update_libraries([directory])
 
     # Get the paths of all MKV files in the directory along with relevant information
     print(f"Scanning .mkv files in {directory}. . .")
@@ -215,8 +222,8 @@ def main(args):
     # Perform the renaming
     rename_files(files_info, series, encoder)
 
-    # Update the Plex libraries
-    plex_update_libraries()
+    # Update the Plex libraries holding the renamed files (nothing else is looked up, so there is no need to wait)
+    plex_update_libraries([directory], wait=False)
 
     print("Done!")
     return
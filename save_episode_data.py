@@ -11,9 +11,10 @@ def save_episode_data(directory):
 
     mkv_files = get_video_files_from_directory(directory)
 
+    print(f'Getting info from Plex for {len(mkv_files)} file(s)')
+    files_episode_info = plex_info.get_plex_info_many(mkv_files)
     for file in mkv_files:
-        print(f'Getting info from Plex for {os.path.basename(file)}')
-        episode_info = plex_info.get_plex_info(file)
+        episode_info = files_episode_info[file]
         if episode_info and 'episode' in episode_info:
             episode_number = episode_info['episode']
             data[episode_number] = episode_info
@@ -27,8 +28,8 @@ def save_episode_data(directory):
 def main(args):
     directory = args.directory
 
-    # Update the Plex libraries
-    plex_update_libraries()
+    # Update the Plex libraries holding the directory and wait for the scan, so the saved data is up to date
+    plex_update_libraries([directory])
 
     print("Getting episode information from Plex and saving. . .")
     save_episode_data(directory)
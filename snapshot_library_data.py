@@ -0,0 +1,192 @@
+import os
+import json
+import argparse
+from itertools import islice
+from utils.plex_server_utilities import *
+
+# Default location of the snapshot
+DEFAULT_SNAPSHOT_PATH = 'library_snapshot.jsonl'
+
+# Fields whose values are saved in the snapshot when they are locked in Plex
+SNAPSHOT_FIELDS = (
+    'title',
+    'titleSort',
+    'originalTitle',
+    'originallyAvailableAt',
+    'summary',
+    'contentRating',
+    'studio',
+    'tagline',
+)
+
+# Number of changed items fetched from Plex at a time when saving, which bounds how many items are held in memory
+SAVE_BATCH_SIZE = 1000
+
+# Number of snapshot records restored at a time, which bounds how much of the snapshot is held in memory
+RESTORE_BATCH_SIZE = 1000
+
+def iter_snapshot(snapshot_path):
+    """Yield the records of the snapshot one line at a time, or nothing if the snapshot does not exist."""
+    if not os.path.exists(snapshot_path):
+        return
+    with open(snapshot_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def get_updated_at(item):
+    """Return the time the item was last updated in Plex as a timestamp."""
+    return int(item.updatedAt.timestamp()) if item.updatedAt else 0
+
+def get_item_record(item, section_key):
+    """Return the snapshot record of an item: its identity, its files, and the values of its locked fields."""
+    locked_fields = {field.name for field in item.fields if field.locked}
+    return {
+        'rating_key': item.ratingKey,
+        'section': section_key,
+        'type': item.type,
+        'updated_at': get_updated_at(item),
+        'files': [part.file for part in item.iterParts()],
+        'fields': {field: format_field_value(getattr(item, field, None)) for field in SNAPSHOT_FIELDS if field in locked_fields},
+    }
+
+def get_sections(section_titles=None):
+    """Return the TV show and movie sections of the Plex server, optionally only those with the given titles."""
+    sections = [section for section in get_plex_server().library.sections() if section.type in ('show', 'movie')]
+    if section_titles:
+        sections = [section for section in sections if section.title in section_titles]
+    return sections
+
+def write_records(f, records):
+    """Write the records to the open snapshot file and return how many were written."""
+    count = 0
+    for record in records:
+        f.write(json.dumps(record, separators=(',', ':')) + '\n')
+        count += 1
+    return count
+
+def fetch_item_records(rating_keys, section_key, previous_records):
+    """Fetch the items from Plex and return their snapshot records and how many were fetched.
+
+    Items that could not be fetched keep their previous record, if they have one.
+    """
+    items = fetch_plex_items(rating_keys)
+    records = []
+    for rating_key in rating_keys:
+        if rating_key in items:
+            records.append(get_item_record(items[rating_key], section_key))
+        elif rating_key in previous_records:
+            records.append(previous_records[rating_key])
+    return records, len(items)
+
+def save_snapshot(snapshot_path, section_titles=None):
+    """Save the locked metadata of every item of the sections to the snapshot, only fetching the items that changed since the last save.
+
+    The sections are listed a page at a time and each item is written as soon as it is listed, except
+    items that are new or whose updatedAt changed, which are fetched in full a batch at a time. Records
+    of sections that are not part of this save are kept as they are.
+    """
+    previous_records = {record['rating_key']: record for record in iter_snapshot(snapshot_path)}
+    sections = get_sections(section_titles)
+    section_keys = {str(section.key) for section in sections}
+
+    temporary_path = snapshot_path + '.part'
+    saved_count = 0
+    fetched_count = 0
+    # The snapshot is only replaced once it is complete, and a partial one is not left behind
+    try:
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            saved_count += write_records(f, (record for record in previous_records.values() if record['section'] not in section_keys))
+
+            for section in sections:
+                print(f'Saving Plex library "{section.title}". . .')
+                section_key = str(section.key)
+                changed_rating_keys = []
+                for item in iter_section_items(section):
+                    previous_record = previous_records.get(item.ratingKey)
+                    if previous_record is not None and previous_record['updated_at'] == get_updated_at(item):
+                        saved_count += write_records(f, [previous_record])
+                        continue
+                    changed_rating_keys.append(item.ratingKey)
+                    if len(changed_rating_keys) >= SAVE_BATCH_SIZE:
+                        records, count = fetch_item_records(changed_rating_keys, section_key, previous_records)
+                        saved_count += write_records(f, records)
+                        fetched_count += count
+                        changed_rating_keys = []
+                if changed_rating_keys:
+                    records, count = fetch_item_records(changed_rating_keys, section_key, previous_records)
+                    saved_count += write_records(f, records)
+                    fetched_count += count
+
+        os.replace(temporary_path, snapshot_path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+    print(f'Saved {saved_count} item(s) to {snapshot_path} ({fetched_count} fetched from Plex).')
+
+def resolve_record_rating_key(record, plex_path_index):
+    """Return the rating key of the item that now owns the files of the record, or the saved rating key if none of them is known."""
+    for file_path in record['files']:
+        rating_key = plex_path_index.get_server_path_rating_key(file_path)
+        if rating_key is not None:
+            return rating_key
+    return record['rating_key']
+
+def restore_snapshot(snapshot_path, section_titles=None, dry_run=False):
+    """Restore the locked metadata of the snapshot to Plex, only editing the fields that differ from it.
+
+    Items are found by their file paths, so metadata survives items being re-matched or re-added, and
+    the snapshot is processed a batch of records at a time.
+    """
+    section_keys = {str(section.key) for section in get_sections(section_titles)} if section_titles else None
+    plex_path_index = get_plex_path_index()
+    plex_path_index.ensure_built()
+
+    records = (record for record in iter_snapshot(snapshot_path) if record['fields'] and (section_keys is None or record['section'] in section_keys))
+    checked_count = 0
+    edited_count = 0
+    while True:
+        batch = list(islice(records, RESTORE_BATCH_SIZE))
+        if not batch:
+            break
+
+        rating_keys = [resolve_record_rating_key(record, plex_path_index) for record in batch]
+        items = fetch_plex_items(rating_keys)
+
+        item_edits = []
+        for record, rating_key in zip(batch, rating_keys):
+            item = items.get(rating_key)
+            if item is None:
+                print(f'Could not find "{record["fields"].get("title", record["rating_key"])}" in Plex.')
+                continue
+            edits = get_metadata_edits(item, record['fields'])
+            if edits:
+                print(f'{"Would update" if dry_run else "Updating"} "{item.title}"')
+                item_edits.append((item, edits))
+        checked_count += len(batch)
+
+        if not dry_run:
+            edited_count += len(item_edits) - len(apply_plex_edits(item_edits))
+        else:
+            edited_count += len(item_edits)
+
+    print(f'Checked {checked_count} item(s) and {"would update" if dry_run else "updated"} {edited_count}.')
+
+def main(args):
+    if args.command == 'save':
+        print("Saving a snapshot of the Plex library metadata. . .")
+        save_snapshot(args.snapshot, section_titles=args.section)
+    else:
+        print("Restoring the Plex library metadata from the snapshot. . .")
+        restore_snapshot(args.snapshot, section_titles=args.section, dry_run=args.dry_run)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='snapshotlibrarydata', description="Save the locked metadata of the Plex libraries to a snapshot, or restore it from one.")
+    parser.add_argument('command', choices=['save', 'restore'], help='Save a snapshot or restore from one')
+    parser.add_argument('snapshot', nargs='?', default=DEFAULT_SNAPSHOT_PATH, help=f'Snapshot file (default: {DEFAULT_SNAPSHOT_PATH})')
+    parser.add_argument('-s', '--section', action='append', default=None, help='Only process the library section with this title (can be repeated).')
+    parser.add_argument('--dry-run', action='store_true', help='When restoring, only print the items that would be updated.')
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,113 @@
+from utils.matroska_helpers import *
+
+# CueTime is only written by these tests, so it is not one of the IDs of the parser
+CUE_TIME_ID = 0xB3
+
+def encode_element_id(element_id):
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big')
+
+def encode_element(element_id, data):
+    """Encode an EBML element, with an 8-byte size for the Segment like mkvmerge writes it."""
+    if isinstance(data, int):
+        data = data.to_bytes(max(1, (data.bit_length() + 7) // 8), 'big')
+    elif isinstance(data, str):
+        data = data.encode('utf-8')
+    elif isinstance(data, list):
+        data = b''.join(data)
+    if element_id == SEGMENT_ID:
+        size = (1 << 56 | len(data)).to_bytes(8, 'big')
+    else:
+        size = (0x80 | len(data)).to_bytes(1, 'big') if len(data) < 0x7F else (0x4000 | len(data)).to_bytes(2, 'big')
+    return encode_element_id(element_id) + size + data
+
+def encode_track_entry(number, track_type, codec_id, language=None, children=()):
+    entry_children = [
+        encode_element(TRACK_NUMBER_ID, number),
+        encode_element(TRACK_UID_ID, number * 1000),
+        encode_element(TRACK_TYPE_ID, track_type),
+        encode_element(CODEC_ID_ID, codec_id),
+    ]
+    if language is not None:
+        entry_children.append(encode_element(LANGUAGE_ID, language))
+    return encode_element(TRACK_ENTRY_ID, entry_children + list(children))
+
+def encode_simple_block(track_number, relative_timestamp, data, flags=0x80):
+    return encode_element(SIMPLE_BLOCK_ID, bytes([0x80 | track_number]) + relative_timestamp.to_bytes(2, 'big', signed=True) + bytes([flags]) + data)
+
+def encode_block_group(track_number, relative_timestamp, data, duration):
+    block = encode_element(BLOCK_ID, bytes([0x80 | track_number]) + relative_timestamp.to_bytes(2, 'big', signed=True) + b'\x00' + data)
+    return encode_element(BLOCK_GROUP_ID, [block, encode_element(BLOCK_DURATION_ID, duration)])
+
+def encode_cluster(timestamp, blocks):
+    return encode_element(CLUSTER_ID, [encode_element(CLUSTER_TIMESTAMP_ID, timestamp)] + blocks)
+
+def write_segment(file_path, elements):
+    """Write a Matroska file whose Segment holds the encoded elements, returning the file's bytes."""
+    header = encode_element(EBML_ID, [encode_element(DOC_TYPE_ID, 'matroska')])
+    data = header + encode_element(SEGMENT_ID, elements)
+    with open(file_path, 'wb') as f:
+        f.write(data)
+    return data
+
+def encode_fixed_unsigned(element_id, value):
+    """Encode an unsigned integer element with a fixed 4-byte value, so its size does not depend on the value."""
+    return encode_element(element_id, value.to_bytes(4, 'big'))
+
+def encode_track_frame_counts_tags(frame_counts):
+    """Encode Tags holding the NUMBER_OF_FRAMES statistics tag of each track number, as mkvmerge writes them."""
+    return encode_element(TAGS_ID, [
+        encode_element(TAG_ID, [
+            encode_element(TARGETS_ID, [encode_element(TAG_TRACK_UID_ID, track_number * 1000)]),
+            encode_element(SIMPLE_TAG_ID, [encode_element(TAG_NAME_ID, 'NUMBER_OF_FRAMES'), encode_element(TAG_STRING_ID, str(frame_count))]),
+        ])
+        for track_number, frame_count in frame_counts.items()
+    ])
+
+def encode_content_compression(algorithm, settings=b'', scope=1):
+    return encode_element(CONTENT_ENCODINGS_ID, [
+        encode_element(CONTENT_ENCODING_ID, [
+            encode_element(CONTENT_ENCODING_SCOPE_ID, scope),
+            encode_element(CONTENT_ENCODING_TYPE_ID, 0),
+            encode_element(CONTENT_COMPRESSION_ID, [encode_element(CONTENT_COMP_ALGO_ID, algorithm)] + ([encode_element(CONTENT_COMP_SETTINGS_ID, settings)] if settings else [])),
+        ])
+    ])
+
+def write_segment_with_cues(file_path, header_elements, clusters, cued_track_numbers):
+    """Write a Matroska file with the header elements, then Cues, then the clusters, returning the file's bytes.
+
+    clusters is a list of (timestamp, [(track number, encoded block)]) and every block of the cued track
+    numbers gets a cue entry with its cluster and relative position.
+    """
+    header_data = b''.join(header_elements)
+    encoded_clusters = []
+    for timestamp, blocks in clusters:
+        timestamp_element = encode_element(CLUSTER_TIMESTAMP_ID, timestamp)
+        cluster = encode_cluster(timestamp, [block for _, block in blocks])
+        data_size = len(timestamp_element) + sum(len(block) for _, block in blocks)
+        relative_positions = []
+        relative_position = len(timestamp_element)
+        for track_number, block in blocks:
+            relative_positions.append((track_number, relative_position))
+            relative_position += len(block)
+        encoded_clusters.append((timestamp, cluster, len(cluster) - data_size, relative_positions))
+
+    def encode_cues(clusters_start):
+        cue_points = []
+        cluster_position = clusters_start
+        for timestamp, cluster, _, relative_positions in encoded_clusters:
+            for track_number, relative_position in relative_positions:
+                if track_number in cued_track_numbers:
+                    cue_points.append(encode_element(CUE_POINT_ID, [
+                        encode_fixed_unsigned(CUE_TIME_ID, timestamp),
+                        encode_element(CUE_TRACK_POSITIONS_ID, [
+                            encode_element(CUE_TRACK_ID, track_number),
+                            encode_fixed_unsigned(CUE_CLUSTER_POSITION_ID, cluster_position),
+                            encode_fixed_unsigned(CUE_RELATIVE_POSITION_ID, relative_position),
+                        ]),
+                    ]))
+            cluster_position += len(cluster)
+        return encode_element(CUES_ID, cue_points)
+
+    # The positions are fixed-width, so the size of the Cues does not depend on where the clusters start
+    cues = encode_cues(len(header_data) + len(encode_cues(0)))
+    return write_segment(file_path, [header_data, cues] + [cluster for _, cluster, _, _ in encoded_clusters])
@@ -0,0 +1,105 @@
+import json
+import subprocess
+import pytest
+from utils import file_management_helpers
+from utils.file_management_helpers import identify_file, parse_tracks_info, clone_or_copy_file
+from matroska_builders import *
+
+def fail_if_mkvmerge_runs(*args, **kwargs):
+    raise AssertionError('mkvmerge should not be run')
+
+def fail_if_file_is_read(*args, **kwargs):
+    raise AssertionError('The file should not be read again')
+
+def test_identify_file_reads_matroska_headers_natively(tmp_path, monkeypatch):
+    file_path = str(tmp_path / 'episode.mkv')
+    tracks = encode_element(TRACKS_ID, [encode_track_entry(1, 1, 'V_VP9', 'und'), encode_track_entry(2, 2, 'A_OPUS', 'jpn')])
+    write_segment(file_path, [tracks, encode_cluster(0, [])])
+    monkeypatch.setattr(subprocess, 'run', fail_if_mkvmerge_runs)
+
+    data = identify_file(file_path, use_cache=False)
+
+    assert [(track['id'], track['type'], track['codec'], track['properties']['language']) for track in data['tracks']] == [(0, 'video', 'VP9', 'und'), (1, 'audio', 'Opus', 'jpn')]
+
+def test_identify_file_falls_back_to_mkvmerge(tmp_path, monkeypatch):
+    file_path = str(tmp_path / 'episode.mkv')
+    write_segment(file_path, [encode_element(TRACKS_ID, [encode_track_entry(1, 2, 'A_DTS')]), encode_cluster(0, [])])
+    mkvmerge_output = {'tracks': [{'id': 0, 'type': 'audio', 'codec': 'DTS-HD Master Audio', 'properties': {'language': 'eng'}}]}
+    commands = []
+    def run_mkvmerge(command, **kwargs):
+        commands.append(command)
+        return subprocess.CompletedProcess(command, 0, stdout=json.dumps(mkvmerge_output), stderr='')
+    monkeypatch.setattr(subprocess, 'run', run_mkvmerge)
+
+    data = identify_file(file_path, use_cache=False)
+
+    assert commands == [['mkvmerge', '-J', file_path]]
+    assert data['tracks'][0]['codec'] == 'DTS-HD Master Audio'
+
+def test_identify_file_reports_mkvmerge_errors(tmp_path, monkeypatch):
+    file_path = str(tmp_path / 'episode.mkv')
+    with open(file_path, 'wb') as f:
+        f.write(b'not a matroska file')
+    def run_mkvmerge(command, **kwargs):
+        return subprocess.CompletedProcess(command, 2, stdout=json.dumps({'errors': ['The type of file could not be recognized.']}), stderr='')
+    monkeypatch.setattr(subprocess, 'run', run_mkvmerge)
+
+    with pytest.raises(ValueError, match='could not be recognized'):
+        identify_file(file_path, use_cache=False)
+
+def test_identify_file_reuses_cached_results_of_unchanged_files(tmp_path, monkeypatch):
+    file_path = str(tmp_path / 'episode.mkv')
+    write_segment(file_path, [encode_element(TRACKS_ID, [encode_track_entry(1, 1, 'V_VP9')]), encode_cluster(0, [])])
+    monkeypatch.setattr(file_management_helpers, 'probe_cache', file_management_helpers.ProbeCache(cache_name='test_probe_cache.json'))
+    monkeypatch.setattr('utils.cache_helpers.CACHE_DIRECTORY', str(tmp_path / 'cache'))
+    first_data = identify_file(file_path)
+    monkeypatch.setattr(file_management_helpers, 'read_matroska_tracks', fail_if_file_is_read)
+    monkeypatch.setattr(subprocess, 'run', fail_if_mkvmerge_runs)
+
+    assert identify_file(file_path) == first_data
+
+def test_parse_tracks_info_uses_file_name_tags_for_missing_properties():
+    data = {'tracks': [{'id': 0, 'type': 'subtitles', 'codec': 'SubRip/SRT', 'properties': {}}]}
+
+    tracks_info = parse_tracks_info(data, '/shows/Episode 01.fr.forced.srt', file_id=2)
+
+    assert tracks_info == [{
+        'file_id': 2,
+        'file_name': '/shows/Episode 01.fr.forced.srt',
+        'number': 1,
+        'id': 0,
+        'type': 'subtitles',
+        'codec': 'SubRip/SRT',
+        'pixel_dimensions': 'N/A',
+        'language': 'fre',
+        'default_track': False,
+        'forced_track': True,
+        'flag_original': False,
+        'flag_hearing_impaired': False,
+        'flag_visual_impaired': False,
+        'flag_text_descriptions': False,
+        'flag_commentary': False,
+        'track_delay': 0,
+        'track_name': 'N/A',
+    }]
+
+def test_parse_tracks_info_prefers_track_properties():
+    data = {'tracks': [{'id': 1, 'type': 'audio', 'codec': 'Opus', 'properties': {'language': 'jpn', 'default_track': True, 'track_name': 'Stereo'}}]}
+
+    track_info = parse_tracks_info(data, '/shows/Episode 01.eng.mka')[0]
+
+    assert (track_info['language'], track_info['default_track'], track_info['forced_track'], track_info['track_name']) == ('jpn', True, False, 'Stereo')
+
+def test_clone_or_copy_file_copies_the_data_whether_or_not_it_can_be_shared(tmp_path):
+    source_path = tmp_path / 'episode.mkv'
+    destination_path = tmp_path / 'remux' / 'episode.mkv'
+    destination_path.parent.mkdir()
+    source_path.write_bytes(bytes(range(256)) * 64)
+
+    clone_or_copy_file(str(source_path), str(destination_path))
+    copied_data = destination_path.read_bytes()
+    with open(destination_path, 'r+b') as f:
+        f.write(b'edited')
+
+    assert copied_data == bytes(range(256)) * 64
+    assert source_path.read_bytes() == bytes(range(256)) * 64
@@ -0,0 +1,240 @@
+import os
+import zlib
+import pytest
+from utils.matroska_helpers import *
+from matroska_builders import *
+
+def write_matroska_file(file_path, with_crc32=False):
+    """Write a small Matroska file with a video, an English audio, and a Japanese audio track."""
+    track_entries = [
+        encode_track_entry(1, 1, 'V_MPEG4/ISO/AVC', 'und'),
+        encode_track_entry(2, 2, 'A_OPUS', 'eng'),
+        encode_track_entry(3, 2, 'A_FLAC', 'jpn'),
+    ]
+    if with_crc32:
+        track_entries.insert(0, encode_element(CRC32_ID, b'\x00\x00\x00\x00'))
+    write_segment(file_path, [
+        encode_element(INFO_ID, [encode_element(TIMESTAMP_SCALE_ID, DEFAULT_TIMESTAMP_SCALE)]),
+        encode_element(TRACKS_ID, track_entries),
+        encode_cluster(0, [encode_simple_block(1, 0, b'frame')]),
+    ])
+
+def get_track_summary(file_path):
+    return [(track['properties']['number'], track['codec'], track['properties']['language']) for track in read_matroska_tracks(file_path)['tracks']]
+
+def test_reorder_track_entries_round_trip(tmp_path):
+    file_path = str(tmp_path / 'episode.mkv')
+    write_matroska_file(file_path)
+    original_size = os.path.getsize(file_path)
+
+    reorder_track_entries(file_path, [0, 2, 1])
+
+    assert get_track_summary(file_path) == [(1, 'AVC/H.264/MPEG-4p10', 'und'), (3, 'FLAC', 'jpn'), (2, 'Opus', 'eng')]
+    assert os.path.getsize(file_path) == original_size
+    assert check_matroska_structure(file_path)[0] == 'valid'
+
+def test_reorder_track_entries_refuses_crc32(tmp_path):
+    file_path = str(tmp_path / 'episode.mkv')
+    write_matroska_file(file_path, with_crc32=True)
+    with open(file_path, 'rb') as f:
+        original_data = f.read()
+
+    with pytest.raises(MatroskaError):
+        reorder_track_entries(file_path, [0, 2, 1])
+
+    with open(file_path, 'rb') as f:
+        assert f.read() == original_data
+
+def test_reorder_track_entries_same_order_leaves_file_unchanged(tmp_path):
+    file_path = str(tmp_path / 'episode.mkv')
+    write_matroska_file(file_path)
+    with open(file_path, 'rb') as f:
+        original_data = f.read()
+    original_mtime = os.stat(file_path).st_mtime_ns
+
+    reorder_track_entries(file_path, [0, 1, 2])
+
+    with open(file_path, 'rb') as f:
+        assert f.read() == original_data
+    assert os.stat(file_path).st_mtime_ns == original_mtime
+
+def test_extract_text_subtitles_skips_laced_blocks_of_other_tracks(tmp_path):
+    file_path = str(tmp_path / 'episode.mkv')
+    output_path = str(tmp_path / 'episode.srt')
+    tracks = encode_element(TRACKS_ID, [
+        encode_track_entry(1, 1, 'V_MPEG4/ISO/AVC'),
+        encode_track_entry(2, 2, 'A_OPUS'),
+        encode_track_entry(3, 17, 'S_TEXT/UTF8'),
+    ])
+    # mkvmerge laces audio by default, which must not stop the extraction of the subtitles
+    laced_audio_block = encode_simple_block(2, 0, b'\x01\x02frameframe', flags=0x82)
+    write_segment(file_path, [
+        tracks,
+        encode_cluster(0, [encode_simple_block(1, 0, b'video'), laced_audio_block, encode_block_group(3, 100, b'First line', 900)]),
+        encode_cluster(2000, [laced_audio_block, encode_block_group(3, 0, b'Second line', 500)]),
+    ])
+
+    extract_text_subtitles(file_path, {2: output_path})
+
+    with open(output_path, encoding='utf-8') as f:
+        assert f.read() == '1\n00:00:00,100 --> 00:00:01,000\nFirst line\n\n2\n00:00:02,000 --> 00:00:02,500\nSecond line\n\n'
+
+def test_read_matroska_tracks_matches_mkvmerge_output(tmp_path):
+    file_path = str(tmp_path / 'episode.mkv')
+    video_track = encode_track_entry(1, 1, 'V_MPEG4/ISO/AVC', children=[
+        encode_element(VIDEO_ID, [encode_element(PIXEL_WIDTH_ID, 1920), encode_element(PIXEL_HEIGHT_ID, 1080)]),
+    ])
+    audio_track = encode_track_entry(2, 2, 'A_FLAC', 'jpn', children=[
+        encode_element(NAME_ID, 'Commentary'),
+        encode_element(FLAG_DEFAULT_ID, 0),
+        encode_element(FLAG_COMMENTARY_ID, 1),
+    ])
+    subtitle_track = encode_track_entry(3, 17, 'S_TEXT/ASS', children=[encode_element(FLAG_FORCED_ID, 1)])
+    write_segment(file_path, [encode_element(TRACKS_ID, [video_track, audio_track, subtitle_track]), encode_cluster(0, [])])
+
+    tracks = read_matroska_tracks(file_path)['tracks']
+
+    assert [(track['id'], track['type'], track['codec']) for track in tracks] == [(0, 'video', 'AVC/H.264/MPEG-4p10'), (1, 'audio', 'FLAC'), (2, 'subtitles', 'SubStationAlpha')]
+    assert tracks[0]['properties']['pixel_dimensions'] == '1920x1080'
+    assert tracks[1]['properties'] == {
+        'number': 2,
+        'language': 'jpn',
+        'default_track': False,
+        'forced_track': False,
+        'enabled_track': True,
+        'flag_commentary': True,
+        'track_name': 'Commentary',
+    }
+    # Matroska defaults: English, default, and not forced
+    assert tracks[2]['properties']['language'] == 'eng'
+    assert tracks[2]['properties']['default_track'] is True
+    assert tracks[2]['properties']['forced_track'] is True
+
+def test_read_matroska_tracks_refuses_codecs_named_by_mkvmerge(tmp_path):
+    file_path = str(tmp_path / 'episode.mkv')
+    write_segment(file_path, [encode_element(TRACKS_ID, [encode_track_entry(1, 2, 'A_DTS')]), encode_cluster(0, [])])
+
+    with pytest.raises(MatroskaError):
+        read_matroska_tracks(file_path)
+
+def test_check_matroska_structure_accepts_a_complete_file(tmp_path):
+    file_path = str(tmp_path / 'episode.mkv')
+    write_matroska_file(file_path)
+
+    assert check_matroska_structure(file_path) == ('valid', '')
+
+def test_check_matroska_structure_detects_truncated_files(tmp_path):
+    file_path = str(tmp_path / 'episode.mkv')
+    write_matroska_file(file_path)
+    with open(file_path, 'r+b') as f:
+        f.truncate(os.path.getsize(file_path) - 4)
+
+    status, details = check_matroska_structure(file_path)
+
+    assert status == 'invalid'
+    assert 'truncated' in details
+
+@pytest.mark.parametrize('data', [b'', b'not a matroska file', encode_element(EBML_ID, [encode_element(DOC_TYPE_ID, 'avi')])])
+def test_check_matroska_structure_rejects_other_files(tmp_path, data):
+    file_path = str(tmp_path / 'episode.mkv')
+    with open(file_path, 'wb') as f:
+        f.write(data)
+
+    assert check_matroska_structure(file_path)[0] == 'invalid'
+
+def test_check_matroska_structure_rejects_unknown_top_level_elements(tmp_path):
+    file_path = str(tmp_path / 'episode.mkv')
+    write_segment(file_path, [encode_element(TRACKS_ID, [encode_track_entry(1, 1, 'V_VP9')]), encode_element(SIMPLE_BLOCK_ID, b'stray'), encode_cluster(0, [])])
+
+    status, details = check_matroska_structure(file_path)
+
+    assert status == 'invalid'
+    assert 'Unexpected element' in details
+
+def test_check_matroska_structure_cannot_judge_clusters_of_unknown_size(tmp_path):
+    file_path = str(tmp_path / 'episode.mkv')
+    # Live-written files have clusters whose size is all ones
+    cluster = encode_element_id(CLUSTER_ID) + b'\xff' + encode_element(CLUSTER_TIMESTAMP_ID, 0)
+    write_segment(file_path, [encode_element(TRACKS_ID, [encode_track_entry(1, 1, 'V_VP9')]), cluster])
+
+    assert check_matroska_structure(file_path)[0] == 'unknown'
+
+SUBTITLE_CLUSTERS = [
+    (0, [(1, encode_simple_block(1, 0, b'video')), (3, encode_block_group(3, 100, b'First line', 900))]),
+    (2000, [(1, encode_simple_block(1, 0, b'video'))]),
+    (4000, [(3, encode_block_group(3, 0, b'Second line', 500))]),
+]
+
+SUBTITLE_SRT = '1\n00:00:00,100 --> 00:00:01,000\nFirst line\n\n2\n00:00:04,000 --> 00:00:04,500\nSecond line\n\n'
+
+def get_subtitle_tracks(*subtitle_children):
+    return encode_element(TRACKS_ID, [encode_track_entry(1, 1, 'V_VP9'), encode_track_entry(3, 17, 'S_TEXT/UTF8', children=subtitle_children)])
+
+def test_extract_text_subtitles_through_the_cues(tmp_path, monkeypatch):
+    file_path = str(tmp_path / 'episode.mkv')
+    output_path = str(tmp_path / 'episode.srt')
+    write_segment_with_cues(file_path, [get_subtitle_tracks(), encode_track_frame_counts_tags({3: 2})], SUBTITLE_CLUSTERS, {3})
+    # With Cues covering every subtitle block, the clusters are never walked
+    monkeypatch.setattr('utils.matroska_helpers.iter_cluster_positions', None)
+
+    extract_text_subtitles(file_path, {1: output_path})
+
+    with open(output_path, encoding='utf-8') as f:
+        assert f.read() == SUBTITLE_SRT
+
+@pytest.mark.parametrize('frame_counts', [None, {3: 3}])
+def test_extract_text_subtitles_walks_the_clusters_when_the_cues_are_incomplete(tmp_path, frame_counts):
+    file_path = str(tmp_path / 'episode.mkv')
+    output_path = str(tmp_path / 'episode.srt')
+    header_elements = [get_subtitle_tracks()]
+    if frame_counts:
+        header_elements.append(encode_track_frame_counts_tags(frame_counts))
+    # Only the video blocks are cued, like mkvmerge does for keyframes
+    write_segment_with_cues(file_path, header_elements, SUBTITLE_CLUSTERS, {1})
+
+    extract_text_subtitles(file_path, {1: output_path})
+
+    with open(output_path, encoding='utf-8') as f:
+        assert f.read() == SUBTITLE_SRT
+
+def test_extract_text_subtitles_decompresses_zlib_frames(tmp_path):
+    file_path = str(tmp_path / 'episode.mkv')
+    output_path = str(tmp_path / 'episode.srt')
+    write_segment(file_path, [
+        get_subtitle_tracks(encode_content_compression(0)),
+        encode_cluster(0, [encode_block_group(3, 100, zlib.compress(b'First line'), 900)]),
+    ])
+
+    extract_text_subtitles(file_path, {1: output_path})
+
+    with open(output_path, encoding='utf-8') as f:
+        assert f.read() == '1\n00:00:00,100 --> 00:00:01,000\nFirst line\n\n'
+
+def test_extract_text_subtitles_restores_stripped_headers(tmp_path):
+    file_path = str(tmp_path / 'episode.mkv')
+    output_path = str(tmp_path / 'episode.ass')
+    codec_private = b'[Script Info]\nScriptType: v4.00+\n'
+    tracks = encode_element(TRACKS_ID, [
+        encode_track_entry(1, 1, 'V_VP9'),
+        encode_track_entry(3, 17, 'S_TEXT/ASS', children=[encode_element(CODEC_PRIVATE_ID, codec_private), encode_content_compression(3, b'0,0,')]),
+    ])
+    write_segment(file_path, [tracks, encode_cluster(0, [encode_block_group(3, 100, b'Default,,0,0,0,,First line', 900)])])
+
+    extract_text_subtitles(file_path, {1: output_path})
+
+    with open(output_path, encoding='utf-8') as f:
+        assert f.read() == '[Script Info]\nScriptType: v4.00+\n\n' + DEFAULT_ASS_EVENTS_HEADER + 'Dialogue: 0,0:00:00.10,0:00:01.00,Default,,0,0,0,,First line\n'
+
+def test_extract_text_subtitles_only_decodes_frames_in_the_encoding_scope(tmp_path):
+    file_path = str(tmp_path / 'episode.mkv')
+    output_path = str(tmp_path / 'episode.srt')
+    # A scope of 2 only compresses the CodecPrivate, so the frames are stored as they are
+    write_segment(file_path, [
+        get_subtitle_tracks(encode_content_compression(3, b'stripped', scope=2)),
+        encode_cluster(0, [encode_block_group(3, 100, b'First line', 900)]),
+    ])
+
+    extract_text_subtitles(file_path, {1: output_path})
+
+    with open(output_path, encoding='utf-8') as f:
+        assert f.read() == '1\n00:00:00,100 --> 00:00:01,000\nFirst line\n\n'
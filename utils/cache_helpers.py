@@ -0,0 +1,44 @@
+import os
+import json
+
+# Directory in which all persistent caches are stored (can be overridden with the NOGHA_CACHE_DIR environment variable)
+CACHE_DIRECTORY = os.getenv('NOGHA_CACHE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache'))
+
+def get_cache_path(cache_name):
+    """Return the full path of the named cache file, creating the cache directory if needed."""
+    os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+    return os.path.join(CACHE_DIRECTORY, cache_name)
+
+def get_file_identity(file_path, stat_result=None):
+    """Return the size, modification time, inode, and device of the file, which change whenever the file is modified or replaced.
+
+    Raises OSError if the file cannot be read. An existing stat result of the file can be given to avoid another stat call.
+    """
+    if stat_result is None:
+        stat_result = os.stat(file_path)
+    return [stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino, stat_result.st_dev]
+
+def load_json_cache(cache_name, default=None):
+    """Load the named JSON cache, returning the default if it does not exist or cannot be read."""
+    cache_path = get_cache_path(cache_name)
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def save_json_cache(cache_name, data):
+    """Atomically write the data to the named JSON cache so that an interrupted run never leaves a partial file."""
+    import tempfile
+    cache_path = get_cache_path(cache_name)
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=CACHE_DIRECTORY, prefix=f'.{cache_name}.', suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(temporary_path, cache_path)
+    except BaseException:
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+        raise
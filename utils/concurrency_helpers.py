@@ -0,0 +1,125 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Default number of jobs that may use a block device at the same time, by the class of the device
+DEVICE_CLASS_LIMITS = {
+    'rotational': 1,
+    'solid_state': 4,
+    'other': 2, # network shares and devices whose class cannot be determined
+}
+
+# Default number of jobs that may run at the same time across all devices
+DEFAULT_MAX_JOBS = 4
+
+# Runs the background tasks started while the user answers prompts one after the other, so a task may wait for the tasks started before it
+background_executor = None
+
+# A job for run_jobs_with_device_limits: function(*args) is run once every device holding one of the paths has a free slot
+DeviceJob = namedtuple('DeviceJob', ['function', 'args', 'paths', 'label'])
+
+def start_background_task(function, *args, **kwargs):
+    """Start function(*args, **kwargs) in a background thread and return a future of its result.
+
+    The function is given a log function to use instead of print, and the messages it logs are only
+    printed once the result is collected with collect_background_result, so that they do not interleave
+    with interactive prompts. If the function raises, the messages are still printed before the exception
+    is re-raised.
+    """
+    global background_executor
+    if background_executor is None:
+        background_executor = ThreadPoolExecutor(max_workers=1)
+
+    def run_with_log():
+        messages = []
+        try:
+            result = function(*args, log=messages.append, **kwargs)
+        except Exception as e:
+            e.background_messages = messages
+            raise
+        return result, messages
+
+    return background_executor.submit(run_with_log)
+
+def collect_background_result(future, log=print):
+    """Wait for a task started with start_background_task, log the messages it logged, and return its result."""
+    try:
+        result, messages = future.result()
+    except Exception as e:
+        for message in getattr(e, 'background_messages', []):
+            log(message)
+        raise
+    for message in messages:
+        log(message)
+    return result
+
+def get_device_id(path):
+    """Return the ID of the device that holds the path, or of its closest existing parent directory."""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return os.stat(path).st_dev
+
+def get_device_class(device_id):
+    """Return 'rotational', 'solid_state', or 'other' for the device, using the Linux sysfs information if available."""
+    sysfs_path = f'/sys/dev/block/{os.major(device_id)}:{os.minor(device_id)}'
+    # Partitions do not have a queue directory of their own, so also check the disk that contains them
+    for device_path in (sysfs_path, os.path.join(os.path.realpath(sysfs_path), '..')):
+        try:
+            with open(os.path.join(device_path, 'queue', 'rotational')) as f:
+                return 'rotational' if f.read().strip() == '1' else 'solid_state'
+        except OSError:
+            continue
+    return 'other'
+
+def run_jobs_with_device_limits(jobs, device_class_limits=DEVICE_CLASS_LIMITS, max_jobs=DEFAULT_MAX_JOBS):
+    """Run the jobs concurrently without exceeding the concurrency limit of any device they read from or write to.
+
+    Jobs are started in order whenever all of their devices have a free slot, and the progress of all
+    jobs is printed as they finish. Returns the results of the jobs in the same order as the jobs, with
+    None for jobs that raised an exception.
+    """
+    device_class_limits = {**DEVICE_CLASS_LIMITS, **device_class_limits}
+    device_limits = {}
+    job_devices = []
+    for job in jobs:
+        devices = sorted({get_device_id(path) for path in job.paths})
+        for device_id in devices:
+            if device_id not in device_limits:
+                device_limits[device_id] = max(1, device_class_limits[get_device_class(device_id)])
+        job_devices.append(devices)
+
+    running_jobs_per_device = {device_id: 0 for device_id in device_limits}
+    pending_indexes = list(range(len(jobs)))
+    results = [None] * len(jobs)
+    finished_count = 0
+
+    with ThreadPoolExecutor(max_workers=max_jobs) as executor:
+        running = {}
+        while pending_indexes or running:
+            # Start every pending job whose devices all have a free slot
+            for index in list(pending_indexes):
+                if len(running) >= max_jobs:
+                    break
+                if all(running_jobs_per_device[device_id] < device_limits[device_id] for device_id in job_devices[index]):
+                    for device_id in job_devices[index]:
+                        running_jobs_per_device[device_id] += 1
+                    running[executor.submit(jobs[index].function, *jobs[index].args)] = index
+                    pending_indexes.remove(index)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                for device_id in job_devices[index]:
+                    running_jobs_per_device[device_id] -= 1
+                finished_count += 1
+                try:
+                    results[index] = future.result()
+                    print(f'[{finished_count}/{len(jobs)}] Finished {jobs[index].label}')
+                except Exception as e:
+                    print(f'[{finished_count}/{len(jobs)}] Failed {jobs[index].label}: {e}')
+
+    return results
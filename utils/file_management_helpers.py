@@ -2,24 +2,53 @@ import os
 import re
 import subprocess
 import json
-import pycountry
+import atexit
+import threading
+from shutil import copyfile
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.cache_helpers import get_file_identity, load_json_cache, save_json_cache
+from utils.matroska_helpers import MatroskaError, read_matroska_tracks
+from utils.language_codes import normalize_language_code
 
 # The pattern for global IDs that input must match
 global_id_pattern = re.compile(r'^\d+:\d+$')
 
+# Number of files probed at the same time and the number of seconds to wait for each probe
+PROBE_WORKERS = 8
+PROBE_TIMEOUT = 120
+
+# Matroska files are probed by reading their headers directly unless NOGHA_NATIVE_PROBE is set to 0
+NATIVE_PROBE_ENABLED = os.getenv('NOGHA_NATIVE_PROBE', '1') != '0'
+NATIVE_PROBE_EXTENSIONS = ('.mkv', '.mka', '.mks', '.webm')
+
+# Name of the on-disk probe cache and the maximum number of files it remembers
+PROBE_CACHE_NAME = 'probe_cache.json'
+PROBE_CACHE_MAX_ENTRIES = 10000
+
+# Track properties from mkvmerge -J that are kept in the probe cache
+CACHED_TRACK_PROPERTIES = (
+    'pixel_dimensions',
+    'language',
+    'default_track',
+    'forced_track',
+    'flag_original',
+    'flag_hearing_impaired',
+    'flag_visual_impaired',
+    'flag_text_descriptions',
+    'flag_commentary',
+    'track_name',
+)
+
+# Linux ioctl request that makes a file share the data blocks of another on copy-on-write file systems (Btrfs, XFS, etc.)
+FICLONE = 0x40049409
+
+# Result of probing a single file. tracks_info is None when the probe failed, in which case error describes why.
+ProbeResult = namedtuple('ProbeResult', ['file_path', 'tracks_info', 'error'])
+
 def is_valid_language_code(lang_code):
-    try:
-        # Attempt to get the language by the 3-letter code
-        language = pycountry.languages.get(alpha_3=lang_code)
-        if not language:
-            # If not found, try to get the language by the 2-letter code
-            language = pycountry.languages.get(alpha_2=lang_code)
-        elif not language:
-            # If not found, try to get the language by the name
-            language = pycountry.languages.get(name=lang_code)
-        return language is not None
-    except KeyError:
-        return False
+    """Check whether the string is a valid 2- or 3-letter language code."""
+    return normalize_language_code(lang_code) is not None
     
 def list_tracks(tracks_info):
     """Display the given tracks info in a readable format."""
@@ -72,51 +101,171 @@ def get_file_extension(codec):
     # Return None if no match is found
     return None
 
-def get_tracks_info(file_path, file_id=0):
-    """Get track information of a .mkv file using mkvmerge."""
-    try:
-        command = f'mkvmerge -J "{file_path}"'
-        result = subprocess.run(command, shell=True, capture_output=True, text=True, encoding='utf-8')
-        output = result.stdout
-        data = json.loads(output)
-
-        # Check the file name for language or forced tags
-        file_tags = os.path.basename(file_path).lower().split('.')[1:-1]
-        forced = 'forced' in file_tags
-        language = 'und' # 'und' for undefined
-        for tag in file_tags:
-            if is_valid_language_code(tag):
-                language = tag
-                break
-        
-        # Extract relevant track information
-        tracks_info = []
-        for number, track in enumerate(data['tracks'], start=1):
-            track_info = {
-                'file_id': file_id,
-                'file_name': file_path,
-                'number': number,
+class ProbeCache:
+    """Persistent cache of mkvmerge -J results.
+
+    Entries are keyed by the absolute file path and are only used while the file's size, modification
+    time, inode and device are unchanged. The least recently used entries are evicted once the cache
+    holds more than max_entries files.
+    """
+    def __init__(self, cache_name=PROBE_CACHE_NAME, max_entries=PROBE_CACHE_MAX_ENTRIES):
+        self.cache_name = cache_name
+        self.max_entries = max_entries
+        self.entries = None
+        self.is_dirty = False
+        self.lock = threading.Lock()
+
+    def _load(self):
+        if self.entries is None:
+            self.entries = OrderedDict(load_json_cache(self.cache_name, default={}))
+
+    def get(self, file_path, stat_result):
+        """Return the cached data for the file, or None if it is missing or the file has changed."""
+        key = os.path.abspath(file_path)
+        with self.lock:
+            self._load()
+            entry = self.entries.get(key)
+            if entry is None or entry['identity'] != get_file_identity(file_path, stat_result):
+                return None
+            self.entries.move_to_end(key)
+            return entry['data']
+
+    def put(self, file_path, stat_result, data):
+        key = os.path.abspath(file_path)
+        with self.lock:
+            self._load()
+            self.entries[key] = {'identity': get_file_identity(file_path, stat_result), 'data': data}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.is_dirty = True
+
+    def save(self):
+        with self.lock:
+            if self.is_dirty:
+                save_json_cache(self.cache_name, self.entries)
+                self.is_dirty = False
+
+# Cache shared by every probe in the process, saved when the process exits
+probe_cache = ProbeCache()
+atexit.register(probe_cache.save)
+
+def get_cacheable_identify_data(data):
+    """Reduce the output of mkvmerge -J to the parts used by parse_tracks_info so that cache entries stay small."""
+    return {
+        'tracks': [
+            {
                 'id': track['id'],
                 'type': track['type'],
                 'codec': track['codec'],
-                'pixel_dimensions': track['properties'].get('pixel_dimensions', 'N/A'),
-                'language': track['properties'].get('language', language),  
-                'default_track': track['properties'].get('default_track', False),
-                'forced_track': track['properties'].get('forced_track', forced),
-                'flag_original': track['properties'].get('flag_original', False),
-                'flag_hearing_impaired': track['properties'].get('flag_hearing_impaired', False),
-                'flag_visual_impaired': track['properties'].get('flag_visual_impaired', False),
-                'flag_text_descriptions': track['properties'].get('flag_text_descriptions', False),
-                'flag_commentary': track['properties'].get('flag_commentary', False),
-                'track_delay': 0,  # Default delay is 0 ms
-                'track_name': track['properties'].get('track_name', 'N/A')
+                'properties': {key: value for key, value in track['properties'].items() if key in CACHED_TRACK_PROPERTIES},
             }
-            tracks_info.append(track_info)
-        
-        return tracks_info
+            for track in data['tracks']
+        ]
+    }
+
+def identify_file(file_path, timeout=PROBE_TIMEOUT, use_cache=True):
+    """Identify the tracks of the file in the shape of mkvmerge -J output, reusing cached results for unchanged files."""
+    stat_result = os.stat(file_path)
+    if use_cache:
+        data = probe_cache.get(file_path, stat_result)
+        if data is not None:
+            return data
+
+    data = None
+    if NATIVE_PROBE_ENABLED and file_path.lower().endswith(NATIVE_PROBE_EXTENSIONS):
+        # Read the tracks straight from the Matroska header, falling back to mkvmerge for anything it cannot parse
+        try:
+            data = read_matroska_tracks(file_path)
+        except (MatroskaError, OSError):
+            data = None
+
+    if data is None:
+        result = subprocess.run(['mkvmerge', '-J', file_path], capture_output=True, text=True, encoding='utf-8', timeout=timeout)
+        data = json.loads(result.stdout)
+        if 'tracks' not in data:
+            errors = data.get('errors') or [f'mkvmerge exited with code {result.returncode}']
+            raise ValueError('; '.join(errors))
+
+    data = get_cacheable_identify_data(data)
+    if use_cache:
+        probe_cache.put(file_path, stat_result, data)
+    return data
+
+def parse_tracks_info(data, file_path, file_id=0):
+    """Convert the JSON output of mkvmerge -J into the list of track dictionaries used throughout this project."""
+    # Check the file name for language or forced tags
+    file_tags = os.path.basename(file_path).lower().split('.')[1:-1]
+    forced = 'forced' in file_tags
+    language = 'und' # 'und' for undefined
+    for tag in file_tags:
+        if is_valid_language_code(tag):
+            language = normalize_language_code(tag)
+            break
+    
+    # Extract relevant track information
+    tracks_info = []
+    for number, track in enumerate(data['tracks'], start=1):
+        track_info = {
+            'file_id': file_id,
+            'file_name': file_path,
+            'number': number,
+            'id': track['id'],
+            'type': track['type'],
+            'codec': track['codec'],
+            'pixel_dimensions': track['properties'].get('pixel_dimensions', 'N/A'),
+            'language': track['properties'].get('language', language),  
+            'default_track': track['properties'].get('default_track', False),
+            'forced_track': track['properties'].get('forced_track', forced),
+            'flag_original': track['properties'].get('flag_original', False),
+            'flag_hearing_impaired': track['properties'].get('flag_hearing_impaired', False),
+            'flag_visual_impaired': track['properties'].get('flag_visual_impaired', False),
+            'flag_text_descriptions': track['properties'].get('flag_text_descriptions', False),
+            'flag_commentary': track['properties'].get('flag_commentary', False),
+            'track_delay': 0,  # Default delay is 0 ms
+            'track_name': track['properties'].get('track_name', 'N/A')
+        }
+        tracks_info.append(track_info)
+    
+    return tracks_info
+
+def get_tracks_info(file_path, file_id=0):
+    """Get track information of a .mkv file using mkvmerge."""
+    try:
+        return parse_tracks_info(identify_file(file_path), file_path, file_id=file_id)
     except Exception as e:
         print(f"Error extracting info from {file_path}: {e}")
         return None
+
+def probe_file(file_path, file_id=0, timeout=PROBE_TIMEOUT):
+    """Get the track information of a single file as a ProbeResult instead of printing errors."""
+    try:
+        tracks_info = parse_tracks_info(identify_file(file_path, timeout=timeout), file_path, file_id=file_id)
+        return ProbeResult(file_path, tracks_info, None)
+    except subprocess.TimeoutExpired:
+        return ProbeResult(file_path, None, f'Timed out after {timeout} seconds')
+    except Exception as e:
+        return ProbeResult(file_path, None, str(e) or type(e).__name__)
+
+def iter_tracks_info(file_paths, file_ids=None, max_workers=PROBE_WORKERS, timeout=PROBE_TIMEOUT):
+    """Probe the files in a bounded pool of workers and yield (index, ProbeResult) pairs as each probe finishes."""
+    if file_ids is None:
+        file_ids = [0] * len(file_paths)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(probe_file, file_path, file_id, timeout): index
+            for index, (file_path, file_id) in enumerate(zip(file_paths, file_ids))
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+def probe_tracks_info(file_paths, file_ids=None, max_workers=PROBE_WORKERS, timeout=PROBE_TIMEOUT):
+    """Probe the files in a bounded pool of workers and return their ProbeResults in the same order as the paths."""
+    results = [None] * len(file_paths)
+    for index, result in iter_tracks_info(file_paths, file_ids=file_ids, max_workers=max_workers, timeout=timeout):
+        results[index] = result
+    return results
     
 def get_episode_number_from_string(search_string):
     """Search the given string to see if it contains an episode number and return it if so."""
@@ -147,40 +296,59 @@ def get_identifying_info_from_tracks_info(tracks_info):
     ]
     return identifying_tracks_info
     
-def get_matching_files_from_directory(directory, recursive=False):
-    """Analyze video files in the directory and its subdirectories and return a list of video files with matching track structures."""
+def get_matching_files_from_directory(directory, recursive=False, log=print):
+    """Analyze video files in the directory and its subdirectories and return a list of video files with matching track structures.
+
+    Messages are passed to log, which is print unless the files are matched in the background.
+    """
     if recursive:
         video_files = get_video_files_from_directory_and_subdirectories(directory)
     else:
         video_files = get_video_files_from_directory(directory)
 
     if not video_files:
-        print("No .mkv, .mp4, or .avi files were found in the directory.")
+        log("No .mkv, .mp4, or .avi files were found in the directory.")
         return
 
-    first_file_info = get_tracks_info(video_files[0])
+    probe_results = probe_tracks_info(video_files)
+
+    first_file_info = probe_results[0].tracks_info
     if first_file_info is None:
-        print(f"Error reading tracks info from {video_files[0]}. Aborting.")
+        log(f"Error reading tracks info from {video_files[0]}: {probe_results[0].error}. Aborting.")
         return
     
-    print(f"Checking that all files have the same track structure as the following: {os.path.basename(video_files[0])}")
+    log(f"Checking that all files have the same track structure as the following: {os.path.basename(video_files[0])}")
     expected_file_info = get_identifying_info_from_tracks_info(first_file_info)
 
     matching_video_files = [video_files[0]] # intialize with the first file
-    for file_path in video_files[1:]:
-        file_info = get_tracks_info(file_path)
-        if file_info is None:
+    for result in probe_results[1:]:
+        if result.tracks_info is None:
+            log(f"Error extracting info from {result.file_path}: {result.error}")
             continue
         
-        if get_identifying_info_from_tracks_info(file_info) == expected_file_info:
-            matching_video_files.append(file_path)
+        if get_identifying_info_from_tracks_info(result.tracks_info) == expected_file_info:
+            matching_video_files.append(result.file_path)
         else:
-            print(f"File {os.path.basename(file_path)} has a different track structure or order of language tags.")
+            log(f"File {os.path.basename(result.file_path)} has a different track structure or order of language tags.")
 
-    print(f"{len(matching_video_files)} matching video files have been found.")
+    log(f"{len(matching_video_files)} matching video files have been found.")
 
     return matching_video_files
 
+def clone_or_copy_file(source_path, destination_path):
+    """Copy the file, only sharing its data blocks where the file system supports copy on write, and fall back to a full copy.
+
+    Returns True if the data blocks are shared, in which case the copy takes no time or space whatever the size of the file.
+    """
+    try:
+        import fcntl
+        with open(source_path, 'rb') as source, open(destination_path, 'wb') as destination:
+            fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+        return True
+    except (ImportError, OSError):
+        copyfile(source_path, destination_path)
+        return False
+
 def get_video_files_from_directory(directory):
     """Return a list of all .mkv, .mp4, or .avi files in the given directory."""
     video_files = []
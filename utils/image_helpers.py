@@ -0,0 +1,44 @@
+import os
+
+# Pillow format names and file extensions of the formats artwork can be saved in
+IMAGE_FORMATS = {
+    'jpeg': ('JPEG', '.jpg'),
+    'webp': ('WEBP', '.webp'),
+}
+
+# Default quality (0-100) of re-encoded images
+DEFAULT_IMAGE_QUALITY = 85
+
+def get_image_extension(image_format):
+    """Return the file extension used for images of the format."""
+    return IMAGE_FORMATS[image_format][1]
+
+def resize_and_encode_image(image_path, width=None, height=None, image_format='jpeg', quality=DEFAULT_IMAGE_QUALITY):
+    """Shrink the image in place to fit within the width and height, and re-encode it as a progressive JPEG or a WebP.
+
+    Images already within the bounds are only re-encoded, never enlarged. The image is written to a
+    temporary file that replaces the original once it is complete. Returns the final size of the image.
+    """
+    from PIL import Image
+
+    pillow_format = IMAGE_FORMATS[image_format][0]
+    temporary_path = image_path + '.part'
+    try:
+        with Image.open(image_path) as image:
+            if width or height:
+                image.thumbnail((width or image.width, height or image.height), Image.LANCZOS)
+            # JPEG has no transparency, and palette images cannot be saved as progressive JPEGs
+            if pillow_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+
+            if pillow_format == 'JPEG':
+                image.save(temporary_path, pillow_format, quality=quality, optimize=True, progressive=True)
+            else:
+                image.save(temporary_path, pillow_format, quality=quality, method=6)
+            size = image.size
+        os.replace(temporary_path, image_path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+    return size
@@ -0,0 +1,56 @@
+import os
+import json
+
+# Precomputed lexicon of language codes generated from pycountry (regenerate with `python -m utils.language_codes`)
+LEXICON_PATH = os.path.join(os.path.dirname(__file__), 'language_codes.json')
+
+# The lexicon is only loaded the first time a language code is looked up
+language_lexicon = None
+
+def build_language_lexicon():
+    """Build the lexicon from pycountry.
+
+    'codes' holds every valid 3-letter code that is already in the form mkvmerge expects, and 'aliases'
+    maps every other accepted code (2-letter codes and ISO 639-2/T codes) to the ISO 639-2/B code that
+    mkvmerge writes.
+    """
+    import pycountry
+
+    codes = set()
+    aliases = {}
+    for language in pycountry.languages:
+        normalized_code = getattr(language, 'bibliographic', None) or language.alpha_3
+        codes.add(normalized_code)
+        for code in (language.alpha_3, getattr(language, 'alpha_2', None)):
+            if code and code != normalized_code:
+                aliases[code] = normalized_code
+    return {
+        'codes': ' '.join(sorted(codes)),
+        'aliases': dict(sorted(aliases.items())),
+    }
+
+def get_language_lexicon():
+    """Return a dictionary that maps every accepted language code to its normalized 3-letter code."""
+    global language_lexicon
+    if language_lexicon is None:
+        try:
+            with open(LEXICON_PATH, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = build_language_lexicon()
+        lexicon = {code: code for code in data['codes'].split()}
+        lexicon.update(data['aliases'])
+        language_lexicon = lexicon
+    return language_lexicon
+
+def normalize_language_code(lang_code):
+    """Return the 3-letter code mkvmerge expects for the language code, or None if it is not a valid code."""
+    if not lang_code:
+        return None
+    return get_language_lexicon().get(lang_code.strip().lower())
+
+if __name__ == "__main__":
+    with open(LEXICON_PATH, 'w', encoding='utf-8') as f:
+        json.dump(build_language_lexicon(), f, separators=(',', ':'))
+        f.write('\n')
+    print(f'Language code lexicon saved as: {LEXICON_PATH}')
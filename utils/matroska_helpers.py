@@ -0,0 +1,762 @@
+import os
+import mmap
+import zlib
+import struct
+from contextlib import contextmanager
+
+# EBML and Matroska element IDs used by this project
+EBML_ID = 0x1A45DFA3
+DOC_TYPE_ID = 0x4282
+SEGMENT_ID = 0x18538067
+SEEK_HEAD_ID = 0x114D9B74
+SEEK_ID = 0x4DBB
+SEEK_ID_ID = 0x53AB
+SEEK_POSITION_ID = 0x53AC
+INFO_ID = 0x1549A966
+TIMESTAMP_SCALE_ID = 0x2AD7B1
+TRACKS_ID = 0x1654AE6B
+TRACK_ENTRY_ID = 0xAE
+TRACK_NUMBER_ID = 0xD7
+TRACK_UID_ID = 0x73C5
+TRACK_TYPE_ID = 0x83
+FLAG_ENABLED_ID = 0xB9
+FLAG_DEFAULT_ID = 0x88
+FLAG_FORCED_ID = 0x55AA
+FLAG_HEARING_IMPAIRED_ID = 0x55AB
+FLAG_VISUAL_IMPAIRED_ID = 0x55AC
+FLAG_TEXT_DESCRIPTIONS_ID = 0x55AD
+FLAG_ORIGINAL_ID = 0x55AE
+FLAG_COMMENTARY_ID = 0x55AF
+NAME_ID = 0x536E
+LANGUAGE_ID = 0x22B59C
+LANGUAGE_BCP47_ID = 0x22B59D
+CODEC_ID_ID = 0x86
+CODEC_PRIVATE_ID = 0x63A2
+VIDEO_ID = 0xE0
+PIXEL_WIDTH_ID = 0xB0
+PIXEL_HEIGHT_ID = 0xBA
+DEFAULT_DURATION_ID = 0x23E383
+CONTENT_ENCODINGS_ID = 0x6D80
+CONTENT_ENCODING_ID = 0x6240
+CONTENT_ENCODING_SCOPE_ID = 0x5032
+CONTENT_ENCODING_TYPE_ID = 0x5033
+CONTENT_COMPRESSION_ID = 0x5034
+CONTENT_COMP_ALGO_ID = 0x4254
+CONTENT_COMP_SETTINGS_ID = 0x4255
+CLUSTER_ID = 0x1F43B675
+CLUSTER_TIMESTAMP_ID = 0xE7
+SIMPLE_BLOCK_ID = 0xA3
+BLOCK_GROUP_ID = 0xA0
+BLOCK_ID = 0xA1
+BLOCK_DURATION_ID = 0x9B
+CUES_ID = 0x1C53BB6B
+CHAPTERS_ID = 0x1043A770
+ATTACHMENTS_ID = 0x1941A469
+TAGS_ID = 0x1254C367
+TAG_ID = 0x7373
+TARGETS_ID = 0x63C0
+TAG_TRACK_UID_ID = 0x63C5
+SIMPLE_TAG_ID = 0x67C8
+TAG_NAME_ID = 0x45A3
+TAG_STRING_ID = 0x4487
+CUE_POINT_ID = 0xBB
+CUE_TRACK_POSITIONS_ID = 0xB7
+CUE_TRACK_ID = 0xF7
+CUE_CLUSTER_POSITION_ID = 0xF1
+CUE_RELATIVE_POSITION_ID = 0xF0
+VOID_ID = 0xEC
+CRC32_ID = 0xBF
+
+# Document types that are parsed natively
+SUPPORTED_DOC_TYPES = ('matroska', 'webm')
+
+# Matroska track types and the names mkvmerge uses for them
+TRACK_TYPES = {
+    1: 'video',
+    2: 'audio',
+    17: 'subtitles',
+}
+
+# Codec IDs whose mkvmerge codec name can be determined from the header alone.
+# Codecs like A_DTS and A_TRUEHD are left out on purpose because mkvmerge names them from the bitstream.
+CODEC_NAMES = {
+    'V_MPEG4/ISO/AVC': 'AVC/H.264/MPEG-4p10',
+    'V_MPEGH/ISO/HEVC': 'HEVC/H.265/MPEG-H',
+    'V_AV1': 'AV1',
+    'V_VP8': 'VP8',
+    'V_VP9': 'VP9',
+    'V_MPEG1': 'MPEG-1/2',
+    'V_MPEG2': 'MPEG-1/2',
+    'V_MPEG4/ISO/SP': 'MPEG-4p2',
+    'V_MPEG4/ISO/ASP': 'MPEG-4p2',
+    'V_MPEG4/ISO/AP': 'MPEG-4p2',
+    'A_AC3': 'AC-3',
+    'A_EAC3': 'E-AC-3',
+    'A_FLAC': 'FLAC',
+    'A_OPUS': 'Opus',
+    'A_VORBIS': 'Vorbis',
+    'A_MPEG/L2': 'MP2',
+    'A_MPEG/L3': 'MP3',
+    'A_PCM/INT/LIT': 'PCM',
+    'S_TEXT/UTF8': 'SubRip/SRT',
+    'S_TEXT/ASS': 'SubStationAlpha',
+    'S_TEXT/SSA': 'SubStationAlpha',
+    'S_TEXT/WEBVTT': 'WebVTT',
+    'S_HDMV/PGS': 'HDMV PGS',
+    'S_VOBSUB': 'VobSub',
+}
+
+# Elements that may appear at the top level of a Segment
+TOP_LEVEL_IDS = (SEEK_HEAD_ID, INFO_ID, TRACKS_ID, CHAPTERS_ID, CLUSTER_ID, CUES_ID, ATTACHMENTS_ID, TAGS_ID, VOID_ID, CRC32_ID)
+
+# Codec IDs of the text subtitles that can be extracted natively
+TEXT_SUBTITLE_CODEC_IDS = ('S_TEXT/UTF8', 'S_TEXT/ASS', 'S_TEXT/SSA')
+
+# Default TimestampScale in nanoseconds
+DEFAULT_TIMESTAMP_SCALE = 1000000
+
+# ContentEncodingScope bits of the track data the compression applies to
+ENCODING_SCOPE_FRAMES = 1
+ENCODING_SCOPE_CODEC_PRIVATE = 2
+
+# The [Events] section written for SSA/ASS tracks whose CodecPrivate does not include one
+DEFAULT_ASS_EVENTS_HEADER = '[Events]\nFormat: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n'
+
+# Track flag elements and the names mkvmerge -J reports them under when present
+TRACK_FLAG_PROPERTIES = {
+    FLAG_ORIGINAL_ID: 'flag_original',
+    FLAG_HEARING_IMPAIRED_ID: 'flag_hearing_impaired',
+    FLAG_VISUAL_IMPAIRED_ID: 'flag_visual_impaired',
+    FLAG_TEXT_DESCRIPTIONS_ID: 'flag_text_descriptions',
+    FLAG_COMMENTARY_ID: 'flag_commentary',
+}
+
+class MatroskaError(Exception):
+    """Raised when a file is not a Matroska file or uses a feature this module does not parse."""
+
+def read_element_id(buffer, position):
+    """Read the element ID at the position and return it along with its length in bytes."""
+    if position >= len(buffer):
+        raise MatroskaError(f'Element ID at {position} is past the end of the file')
+    first_byte = buffer[position]
+    length = 1
+    mask = 0x80
+    while length <= 4 and not first_byte & mask:
+        length += 1
+        mask >>= 1
+    if length > 4 or position + length > len(buffer):
+        raise MatroskaError(f'Invalid element ID at {position}')
+    return int.from_bytes(buffer[position:position + length], 'big'), length
+
+def read_element_size(buffer, position):
+    """Read the element data size at the position and return it along with its length in bytes.
+
+    The size is None for elements of unknown size.
+    """
+    if position >= len(buffer):
+        raise MatroskaError(f'Element size at {position} is past the end of the file')
+    first_byte = buffer[position]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first_byte & mask:
+        length += 1
+        mask >>= 1
+    if length > 8 or position + length > len(buffer):
+        raise MatroskaError(f'Invalid element size at {position}')
+    size = first_byte & (mask - 1)
+    for byte in buffer[position + 1:position + length]:
+        size = (size << 8) | byte
+    if size == (1 << (7 * length)) - 1:
+        return None, length
+    return size, length
+
+def read_element_header(buffer, position):
+    """Return the ID, data start and data size (None if unknown) of the element at the position."""
+    element_id, id_length = read_element_id(buffer, position)
+    size, size_length = read_element_size(buffer, position + id_length)
+    return element_id, position + id_length + size_length, size
+
+def iter_child_elements(buffer, start, end):
+    """Yield (element ID, element start, data start, data end) for every child element between start and end."""
+    position = start
+    while position < end:
+        element_id, data_start, size = read_element_header(buffer, position)
+        if size is None:
+            raise MatroskaError(f'Unexpected element of unknown size at {position}')
+        data_end = data_start + size
+        if data_end > end:
+            raise MatroskaError(f'Element at {position} extends past its parent')
+        yield element_id, position, data_start, data_end
+        position = data_end
+
+def read_unsigned(buffer, start, end):
+    return int.from_bytes(buffer[start:end], 'big') if end > start else 0
+
+def read_float(buffer, start, end):
+    if end - start == 4:
+        return struct.unpack('>f', buffer[start:end])[0]
+    elif end - start == 8:
+        return struct.unpack('>d', buffer[start:end])[0]
+    return 0.0
+
+def read_string(buffer, start, end):
+    return bytes(buffer[start:end]).rstrip(b'\x00').decode('utf-8', errors='replace')
+
+@contextmanager
+def open_matroska(file_path, writable=False):
+    """Memory-map the file so that only the pages that are actually read are loaded from disk."""
+    with open(file_path, 'r+b' if writable else 'rb') as f:
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=access)
+        except ValueError:
+            raise MatroskaError('The file is empty')
+        try:
+            yield buffer
+        finally:
+            buffer.close()
+
+def read_segment_layout(buffer):
+    """Locate the Segment and the positions of its top-level metadata elements.
+
+    The top-level elements before the first Cluster are walked directly, and elements that are stored
+    after the clusters are found through the SeekHead. Returns a dictionary with the segment data start,
+    size (None if unknown) and end positions and the element start position of each element ID found.
+    """
+    element_id, data_start, size = read_element_header(buffer, 0)
+    if element_id != EBML_ID or size is None:
+        raise MatroskaError('The file does not start with an EBML header')
+    doc_type = None
+    for child_id, _, child_start, child_end in iter_child_elements(buffer, data_start, data_start + size):
+        if child_id == DOC_TYPE_ID:
+            doc_type = read_string(buffer, child_start, child_end)
+    if doc_type not in SUPPORTED_DOC_TYPES:
+        raise MatroskaError(f'Unsupported document type: {doc_type}')
+
+    segment_position = data_start + size
+    element_id, segment_start, segment_size = read_element_header(buffer, segment_position)
+    if element_id != SEGMENT_ID:
+        raise MatroskaError('The EBML header is not followed by a Segment')
+    segment_end = len(buffer) if segment_size is None else min(segment_start + segment_size, len(buffer))
+
+    elements = {}
+    position = segment_start
+    while position < segment_end:
+        element_id, data_start, size = read_element_header(buffer, position)
+        elements.setdefault(element_id, position)
+        if element_id == CLUSTER_ID or size is None:
+            break
+        if element_id == SEEK_HEAD_ID:
+            for seek_id, seek_position in read_seek_head(buffer, data_start, data_start + size):
+                elements.setdefault(seek_id, segment_start + seek_position)
+        position = data_start + size
+
+    return {
+        'segment_start': segment_start,
+        'segment_size': segment_size,
+        'segment_end': segment_end,
+        'elements': elements,
+    }
+
+def read_seek_head(buffer, start, end):
+    """Return a list of (element ID, position relative to the segment data) pairs from a SeekHead."""
+    seeks = []
+    for child_id, _, child_start, child_end in iter_child_elements(buffer, start, end):
+        if child_id != SEEK_ID:
+            continue
+        seek_id = None
+        seek_position = None
+        for seek_child_id, _, seek_child_start, seek_child_end in iter_child_elements(buffer, child_start, child_end):
+            if seek_child_id == SEEK_ID_ID:
+                seek_id = read_unsigned(buffer, seek_child_start, seek_child_end)
+            elif seek_child_id == SEEK_POSITION_ID:
+                seek_position = read_unsigned(buffer, seek_child_start, seek_child_end)
+        if seek_id is not None and seek_position is not None:
+            seeks.append((seek_id, seek_position))
+    return seeks
+
+def get_element_data_range(buffer, layout, element_id):
+    """Return the (data start, data end) range of a top-level element found by read_segment_layout."""
+    position = layout['elements'].get(element_id)
+    if position is None:
+        raise MatroskaError(f'The file has no element with ID {element_id:#x}')
+    found_id, data_start, size = read_element_header(buffer, position)
+    if found_id != element_id or size is None or data_start + size > len(buffer):
+        raise MatroskaError(f'Invalid element with ID {element_id:#x} at {position}')
+    return data_start, data_start + size
+
+def read_track_entry(buffer, start, end, track_id):
+    """Convert a TrackEntry element into the track dictionary shape of mkvmerge -J."""
+    values = {}
+    for child_id, _, child_start, child_end in iter_child_elements(buffer, start, end):
+        if child_id == VIDEO_ID:
+            for video_child_id, _, video_child_start, video_child_end in iter_child_elements(buffer, child_start, child_end):
+                if video_child_id in (PIXEL_WIDTH_ID, PIXEL_HEIGHT_ID):
+                    values[video_child_id] = read_unsigned(buffer, video_child_start, video_child_end)
+        elif child_id in (NAME_ID, LANGUAGE_ID, LANGUAGE_BCP47_ID, CODEC_ID_ID):
+            values[child_id] = read_string(buffer, child_start, child_end)
+        elif child_id in (TRACK_NUMBER_ID, TRACK_TYPE_ID, FLAG_ENABLED_ID, FLAG_DEFAULT_ID, FLAG_FORCED_ID) or child_id in TRACK_FLAG_PROPERTIES:
+            values[child_id] = read_unsigned(buffer, child_start, child_end)
+
+    track_type = TRACK_TYPES.get(values.get(TRACK_TYPE_ID))
+    if track_type is None:
+        raise MatroskaError(f'Unsupported track type: {values.get(TRACK_TYPE_ID)}')
+    codec = CODEC_NAMES.get(values.get(CODEC_ID_ID))
+    if codec is None:
+        raise MatroskaError(f'Codec {values.get(CODEC_ID_ID)} must be identified by mkvmerge')
+    if LANGUAGE_ID not in values and LANGUAGE_BCP47_ID in values:
+        raise MatroskaError('Track only has an IETF BCP 47 language')
+
+    properties = {
+        'number': values.get(TRACK_NUMBER_ID),
+        'language': values.get(LANGUAGE_ID, 'eng'), # 'eng' is the Matroska default language
+        'default_track': bool(values.get(FLAG_DEFAULT_ID, 1)),
+        'forced_track': bool(values.get(FLAG_FORCED_ID, 0)),
+        'enabled_track': bool(values.get(FLAG_ENABLED_ID, 1)),
+    }
+    for flag_id, property_name in TRACK_FLAG_PROPERTIES.items():
+        if flag_id in values:
+            properties[property_name] = bool(values[flag_id])
+    if NAME_ID in values:
+        properties['track_name'] = values[NAME_ID]
+    if PIXEL_WIDTH_ID in values and PIXEL_HEIGHT_ID in values:
+        properties['pixel_dimensions'] = f'{values[PIXEL_WIDTH_ID]}x{values[PIXEL_HEIGHT_ID]}'
+
+    return {
+        'id': track_id,
+        'type': track_type,
+        'codec': codec,
+        'properties': properties,
+    }
+
+def read_matroska_tracks(file_path):
+    """Read the tracks of a Matroska file from its header without running mkvmerge.
+
+    Returns a dictionary in the same shape as the output of mkvmerge -J (only the tracks are included)
+    and raises MatroskaError for anything that should be identified by mkvmerge instead.
+    """
+    with open_matroska(file_path) as buffer:
+        layout = read_segment_layout(buffer)
+        tracks_start, tracks_end = get_element_data_range(buffer, layout, TRACKS_ID)
+        tracks = []
+        for child_id, _, child_start, child_end in iter_child_elements(buffer, tracks_start, tracks_end):
+            if child_id == TRACK_ENTRY_ID:
+                tracks.append(read_track_entry(buffer, child_start, child_end, track_id=len(tracks)))
+    if not tracks:
+        raise MatroskaError('The file has no tracks')
+    return {'tracks': tracks}
+
+def reorder_track_entries(file_path, track_order):
+    """Reorder the TrackEntry elements of a Matroska file in place, without remuxing it.
+
+    track_order lists the current positions (the mkvmerge track IDs) of the tracks in their new order
+    and must include every track exactly once. The entries are only permuted inside the existing Tracks
+    element, so its size and every other element of the file stay where they are.
+    """
+    with open_matroska(file_path, writable=True) as buffer:
+        layout = read_segment_layout(buffer)
+        tracks_start, tracks_end = get_element_data_range(buffer, layout, TRACKS_ID)
+
+        track_entries = []
+        other_elements = []
+        for child_id, child_position, _, child_end in iter_child_elements(buffer, tracks_start, tracks_end):
+            if child_id == CRC32_ID:
+                raise MatroskaError('The Tracks element is protected by a CRC-32')
+            elif child_id == TRACK_ENTRY_ID:
+                track_entries.append(bytes(buffer[child_position:child_end]))
+            else:
+                # Void padding and any other children are kept after the reordered entries
+                other_elements.append(bytes(buffer[child_position:child_end]))
+
+        if sorted(track_order) != list(range(len(track_entries))):
+            raise MatroskaError('The new order does not contain exactly the tracks of the file')
+        if list(track_order) == sorted(track_order):
+            # The tracks are already in this order, so the file is left untouched
+            return
+
+        new_tracks_data = b''.join(track_entries[track_id] for track_id in track_order) + b''.join(other_elements)
+        buffer[tracks_start:tracks_end] = new_tracks_data
+        buffer.flush()
+
+    # Make sure cached probe results for the file are invalidated
+    os.utime(file_path)
+
+def read_timestamp_scale(buffer, layout):
+    """Return the TimestampScale of the segment in nanoseconds."""
+    if INFO_ID not in layout['elements']:
+        return DEFAULT_TIMESTAMP_SCALE
+    info_start, info_end = get_element_data_range(buffer, layout, INFO_ID)
+    for child_id, _, child_start, child_end in iter_child_elements(buffer, info_start, info_end):
+        if child_id == TIMESTAMP_SCALE_ID:
+            return read_unsigned(buffer, child_start, child_end)
+    return DEFAULT_TIMESTAMP_SCALE
+
+def read_content_compression(buffer, start, end):
+    """Return the (algorithm, settings, scope) of the compression of a track, raising MatroskaError for encryption."""
+    compression = None
+    for encoding_id, _, encoding_start, encoding_end in iter_child_elements(buffer, start, end):
+        if encoding_id != CONTENT_ENCODING_ID:
+            continue
+        if compression is not None:
+            raise MatroskaError('Tracks with more than one content encoding are not supported')
+        encoding_type = 0
+        scope = 1
+        algorithm = 0
+        settings = b''
+        for child_id, _, child_start, child_end in iter_child_elements(buffer, encoding_start, encoding_end):
+            if child_id == CONTENT_ENCODING_TYPE_ID:
+                encoding_type = read_unsigned(buffer, child_start, child_end)
+            elif child_id == CONTENT_ENCODING_SCOPE_ID:
+                scope = read_unsigned(buffer, child_start, child_end)
+            elif child_id == CONTENT_COMPRESSION_ID:
+                for compression_id, _, compression_start, compression_end in iter_child_elements(buffer, child_start, child_end):
+                    if compression_id == CONTENT_COMP_ALGO_ID:
+                        algorithm = read_unsigned(buffer, compression_start, compression_end)
+                    elif compression_id == CONTENT_COMP_SETTINGS_ID:
+                        settings = bytes(buffer[compression_start:compression_end])
+        if encoding_type != 0:
+            raise MatroskaError('Encrypted tracks are not supported')
+        if algorithm not in (0, 3):
+            raise MatroskaError(f'Compression algorithm {algorithm} is not supported')
+        compression = (algorithm, settings, scope)
+    return compression
+
+def decode_content(data, compression, scope=ENCODING_SCOPE_FRAMES):
+    """Undo the zlib or header stripping compression of a frame, or of a CodecPrivate with the CodecPrivate scope.
+
+    The data is returned as it is when the ContentEncodingScope of the compression does not include the scope.
+    """
+    if compression is None:
+        return data
+    algorithm, settings, encoding_scope = compression
+    if not encoding_scope & scope:
+        return data
+    if algorithm == 0:
+        return zlib.decompress(data)
+    return settings + data
+
+def read_text_subtitle_tracks(buffer, layout, track_ids):
+    """Return a dictionary of track number to header information for the requested text subtitle track IDs."""
+    tracks_start, tracks_end = get_element_data_range(buffer, layout, TRACKS_ID)
+    tracks = {}
+    track_id = 0
+    for child_id, _, child_start, child_end in iter_child_elements(buffer, tracks_start, tracks_end):
+        if child_id != TRACK_ENTRY_ID:
+            continue
+        if track_id in track_ids:
+            track = {'id': track_id, 'uid': None, 'codec_id': None, 'codec_private': b'', 'default_duration': 0, 'compression': None}
+            track_number = None
+            for entry_id, _, entry_start, entry_end in iter_child_elements(buffer, child_start, child_end):
+                if entry_id == TRACK_NUMBER_ID:
+                    track_number = read_unsigned(buffer, entry_start, entry_end)
+                elif entry_id == TRACK_UID_ID:
+                    track['uid'] = read_unsigned(buffer, entry_start, entry_end)
+                elif entry_id == CODEC_ID_ID:
+                    track['codec_id'] = read_string(buffer, entry_start, entry_end)
+                elif entry_id == CODEC_PRIVATE_ID:
+                    track['codec_private'] = bytes(buffer[entry_start:entry_end])
+                elif entry_id == DEFAULT_DURATION_ID:
+                    track['default_duration'] = read_unsigned(buffer, entry_start, entry_end)
+                elif entry_id == CONTENT_ENCODINGS_ID:
+                    track['compression'] = read_content_compression(buffer, entry_start, entry_end)
+            if track['codec_id'] not in TEXT_SUBTITLE_CODEC_IDS:
+                raise MatroskaError(f'Track {track_id} is not a text subtitle track')
+            track['codec_private'] = decode_content(track['codec_private'], track['compression'], scope=ENCODING_SCOPE_CODEC_PRIVATE)
+            tracks[track_number] = track
+        track_id += 1
+
+    if len(tracks) != len(track_ids):
+        raise MatroskaError('Not all of the requested tracks were found')
+    return tracks
+
+def read_cue_positions(buffer, layout, track_numbers):
+    """Return a dictionary of each track number to the (cluster position, relative block position) pairs the Cues index for it.
+
+    Returns None when the file has no Cues. The relative position is None for entries written without a
+    CueRelativePosition.
+    """
+    if CUES_ID not in layout['elements']:
+        return None
+    cues_start, cues_end = get_element_data_range(buffer, layout, CUES_ID)
+    positions = {track_number: set() for track_number in track_numbers}
+    for cue_point_id, _, cue_point_start, cue_point_end in iter_child_elements(buffer, cues_start, cues_end):
+        if cue_point_id != CUE_POINT_ID:
+            continue
+        for child_id, _, child_start, child_end in iter_child_elements(buffer, cue_point_start, cue_point_end):
+            if child_id != CUE_TRACK_POSITIONS_ID:
+                continue
+            values = {}
+            for position_id, _, position_start, position_end in iter_child_elements(buffer, child_start, child_end):
+                if position_id in (CUE_TRACK_ID, CUE_CLUSTER_POSITION_ID, CUE_RELATIVE_POSITION_ID):
+                    values[position_id] = read_unsigned(buffer, position_start, position_end)
+            if values.get(CUE_TRACK_ID) in positions and CUE_CLUSTER_POSITION_ID in values:
+                positions[values[CUE_TRACK_ID]].add((layout['segment_start'] + values[CUE_CLUSTER_POSITION_ID], values.get(CUE_RELATIVE_POSITION_ID)))
+    return positions
+
+def read_track_frame_counts(buffer, layout, track_uids):
+    """Return a dictionary of track UID to the NUMBER_OF_FRAMES statistics tag of the track, for the tracks that have one."""
+    if TAGS_ID not in layout['elements']:
+        return {}
+    tags_start, tags_end = get_element_data_range(buffer, layout, TAGS_ID)
+    frame_counts = {}
+    for tag_id, _, tag_start, tag_end in iter_child_elements(buffer, tags_start, tags_end):
+        if tag_id != TAG_ID:
+            continue
+        target_uids = []
+        frame_count = None
+        for child_id, _, child_start, child_end in iter_child_elements(buffer, tag_start, tag_end):
+            if child_id == TARGETS_ID:
+                for target_id, _, target_start, target_end in iter_child_elements(buffer, child_start, child_end):
+                    if target_id == TAG_TRACK_UID_ID:
+                        target_uids.append(read_unsigned(buffer, target_start, target_end))
+            elif child_id == SIMPLE_TAG_ID:
+                values = {}
+                for simple_tag_id, _, simple_tag_start, simple_tag_end in iter_child_elements(buffer, child_start, child_end):
+                    if simple_tag_id in (TAG_NAME_ID, TAG_STRING_ID):
+                        values[simple_tag_id] = read_string(buffer, simple_tag_start, simple_tag_end)
+                if values.get(TAG_NAME_ID) == 'NUMBER_OF_FRAMES' and values.get(TAG_STRING_ID, '').strip().isdigit():
+                    frame_count = int(values[TAG_STRING_ID])
+        if frame_count is not None and len(target_uids) == 1 and target_uids[0] in track_uids:
+            frame_counts[target_uids[0]] = frame_count
+    return frame_counts
+
+def get_indexed_block_positions(buffer, layout, tracks):
+    """Return the (cluster position, relative block position) pairs of every block of the tracks if the Cues index all of them, or None otherwise.
+
+    Cues usually only index some of the blocks, so they are only trusted when, for every track, the
+    number of indexed blocks matches the NUMBER_OF_FRAMES statistics tag mkvmerge writes for the track.
+    """
+    cue_positions = read_cue_positions(buffer, layout, set(tracks))
+    if cue_positions is None:
+        return None
+    frame_counts = read_track_frame_counts(buffer, layout, {track['uid'] for track in tracks.values()})
+    for track_number, track in tracks.items():
+        if track['uid'] not in frame_counts or len(cue_positions[track_number]) != frame_counts[track['uid']]:
+            return None
+    return set().union(*cue_positions.values())
+
+def read_block(buffer, position, track_numbers=None):
+    """Read the SimpleBlock or BlockGroup at the position and return (track number, relative timestamp, frame data, duration or None).
+
+    With track_numbers, blocks of other tracks return None as soon as their track number is read, so
+    their frames are neither copied nor checked for lacing.
+    """
+    element_id, data_start, size = read_element_header(buffer, position)
+    if size is None:
+        raise MatroskaError(f'Block of unknown size at {position}')
+    data_end = data_start + size
+    duration = None
+    if element_id == BLOCK_GROUP_ID:
+        block_range = None
+        for child_id, _, child_start, child_end in iter_child_elements(buffer, data_start, data_end):
+            if child_id == BLOCK_ID:
+                block_range = (child_start, child_end)
+            elif child_id == BLOCK_DURATION_ID:
+                duration = read_unsigned(buffer, child_start, child_end)
+        if block_range is None:
+            raise MatroskaError(f'BlockGroup without a Block at {position}')
+        data_start, data_end = block_range
+    elif element_id != SIMPLE_BLOCK_ID:
+        raise MatroskaError(f'Expected a block at {position}')
+
+    track_number, track_number_length = read_element_size(buffer, data_start)
+    header_end = data_start + track_number_length + 3
+    if track_number is None or header_end > data_end:
+        raise MatroskaError(f'Invalid block header at {position}')
+    if track_numbers is not None and track_number not in track_numbers:
+        return None
+    relative_timestamp = struct.unpack('>h', buffer[header_end - 3:header_end - 1])[0]
+    if buffer[header_end - 1] & 0x06:
+        raise MatroskaError(f'Laced subtitle block at {position}')
+    return track_number, relative_timestamp, bytes(buffer[header_end:data_end]), duration
+
+def read_cluster_timestamp(buffer, cluster_position):
+    """Return the Timestamp of the cluster at the position along with the range of the cluster's data."""
+    element_id, data_start, size = read_element_header(buffer, cluster_position)
+    if element_id != CLUSTER_ID or size is None:
+        raise MatroskaError(f'Expected a cluster of known size at {cluster_position}')
+    data_end = min(data_start + size, len(buffer))
+    for child_id, _, child_start, child_end in iter_child_elements(buffer, data_start, data_end):
+        if child_id == CLUSTER_TIMESTAMP_ID:
+            return read_unsigned(buffer, child_start, child_end), data_start, data_end
+    raise MatroskaError(f'Cluster without a timestamp at {cluster_position}')
+
+def iter_cluster_blocks(buffer, data_start, data_end):
+    """Yield the positions of every SimpleBlock and BlockGroup of a cluster, reading only the element headers."""
+    for child_id, child_position, _, _ in iter_child_elements(buffer, data_start, data_end):
+        if child_id in (SIMPLE_BLOCK_ID, BLOCK_GROUP_ID):
+            yield child_position
+
+def iter_cluster_positions(buffer, layout):
+    """Yield the position of every cluster of the segment by skipping from one top-level element to the next."""
+    position = layout['segment_start']
+    while position < layout['segment_end']:
+        element_id, data_start, size = read_element_header(buffer, position)
+        if size is None:
+            raise MatroskaError(f'Top-level element of unknown size at {position}')
+        if element_id == CLUSTER_ID:
+            yield position
+        position = data_start + size
+
+def format_srt_timestamp(milliseconds):
+    hours, milliseconds = divmod(int(milliseconds), 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f'{hours:02}:{minutes:02}:{seconds:02},{milliseconds:03}'
+
+def format_ass_timestamp(milliseconds):
+    hours, milliseconds = divmod(int(milliseconds), 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f'{hours}:{minutes:02}:{seconds:02}.{milliseconds // 10:02}'
+
+def write_text_subtitles(track, events, output_path):
+    """Write the (start, end, text) events of a text subtitle track in the SRT or SSA/ASS format."""
+    with open(output_path, 'w', encoding='utf-8', newline='\n') as f:
+        if track['codec_id'] == 'S_TEXT/UTF8':
+            for number, (start, end, text) in enumerate(sorted(events, key=lambda event: event[0]), start=1):
+                f.write(f'{number}\n{format_srt_timestamp(start)} --> {format_srt_timestamp(end)}\n{text.strip()}\n\n')
+        else:
+            header = track['codec_private'].decode('utf-8', errors='replace').replace('\r\n', '\n').rstrip('\n') + '\n'
+            if '[Events]' not in header:
+                header += '\n' + DEFAULT_ASS_EVENTS_HEADER
+            f.write(header)
+            # Block data is "ReadOrder, Layer, Style, Name, MarginL, MarginR, MarginV, Effect, Text"
+            lines = []
+            for start, end, text in events:
+                fields = text.split(',', 2)
+                if len(fields) != 3:
+                    continue
+                read_order, layer, rest = fields
+                read_order = int(read_order) if read_order.strip().isdigit() else 0
+                lines.append((read_order, start, f'Dialogue: {layer},{format_ass_timestamp(start)},{format_ass_timestamp(end)},{rest}\n'))
+            for _, _, line in sorted(lines):
+                f.write(line)
+
+def extract_text_subtitles(file_path, track_outputs):
+    """Extract text subtitle tracks (SRT, SSA, and ASS) in a single pass without reading the rest of the file.
+
+    track_outputs maps mkvmerge track IDs to output paths. The blocks of the tracks are found through the
+    Cues when they index every block of the requested tracks, and otherwise by skipping from block header
+    to block header through all the clusters. Raises MatroskaError for anything that should be extracted
+    by mkvextract.
+    """
+    with open_matroska(file_path) as buffer:
+        layout = read_segment_layout(buffer)
+        timestamp_scale = read_timestamp_scale(buffer, layout)
+        tracks = read_text_subtitle_tracks(buffer, layout, set(track_outputs))
+
+        # Group the block positions to visit by cluster
+        block_positions = {}
+        indexed_positions = get_indexed_block_positions(buffer, layout, tracks)
+        if indexed_positions is not None:
+            for cluster_position, relative_position in indexed_positions:
+                block_positions.setdefault(cluster_position, set()).add(relative_position)
+        else:
+            for cluster_position in iter_cluster_positions(buffer, layout):
+                block_positions[cluster_position] = {None}
+
+        events = {track_number: [] for track_number in tracks}
+        for cluster_position in sorted(block_positions):
+            cluster_timestamp, data_start, data_end = read_cluster_timestamp(buffer, cluster_position)
+            relative_positions = block_positions[cluster_position]
+            if None in relative_positions:
+                positions = iter_cluster_blocks(buffer, data_start, data_end)
+            else:
+                positions = sorted(data_start + relative_position for relative_position in relative_positions)
+
+            for position in positions:
+                block = read_block(buffer, position, track_numbers=tracks)
+                if block is None:
+                    continue
+                track_number, relative_timestamp, data, duration = block
+                track = tracks[track_number]
+                start = (cluster_timestamp + relative_timestamp) * timestamp_scale
+                if duration is not None:
+                    end = start + duration * timestamp_scale
+                else:
+                    end = start + track['default_duration']
+                text = decode_content(data, track['compression']).decode('utf-8', errors='replace')
+                events[track_number].append((start / 1000000, end / 1000000, text))
+
+    for track_number, track in tracks.items():
+        write_text_subtitles(track, events[track_number], track_outputs[track['id']])
+
+def check_matroska_structure(file_path):
+    """Check the element structure of a Matroska file without reading its frames.
+
+    Every top-level element of the Segment must be a known element that ends inside the Segment, the
+    Segment must not extend past the end of the file, SeekHead entries must point at the elements they
+    name, Cues must point at clusters, and the children of the last cluster must be complete. Returns
+    ('valid', details), ('invalid', details) for definite failures, or ('unknown', details) when the
+    file cannot be judged this way (e.g. live-written files with elements of unknown size).
+    """
+    try:
+        with open_matroska(file_path) as buffer:
+            return check_segment_structure(buffer)
+    except MatroskaError as e:
+        return 'invalid', str(e)
+
+def check_segment_structure(buffer):
+    """Check the structure of the memory-mapped file for check_matroska_structure."""
+    layout = read_segment_layout(buffer)
+    segment_start = layout['segment_start']
+    if layout['segment_size'] is not None and segment_start + layout['segment_size'] > len(buffer):
+        return 'invalid', f'The file is truncated: the segment ends at {segment_start + layout["segment_size"]} but the file is {len(buffer)} bytes long'
+
+    # Walk the top-level elements, which only reads one element header per cluster
+    top_level_positions = {}
+    last_cluster = None
+    position = segment_start
+    while position < layout['segment_end']:
+        element_id, data_start, size = read_element_header(buffer, position)
+        if element_id not in TOP_LEVEL_IDS:
+            return 'invalid', f'Unexpected element {element_id:#x} at {position}'
+        if size is None:
+            return 'unknown', f'Element {element_id:#x} at {position} has an unknown size'
+        if data_start + size > layout['segment_end']:
+            return 'invalid', f'Element {element_id:#x} at {position} extends past the end of the segment'
+        top_level_positions[position] = element_id
+        if element_id == CLUSTER_ID:
+            last_cluster = (position, data_start, data_start + size)
+        position = data_start + size
+
+    if last_cluster is None:
+        return 'invalid', 'The file has no clusters'
+
+    # Check that the SeekHeads point at the elements they name
+    for position, element_id in top_level_positions.items():
+        if element_id != SEEK_HEAD_ID:
+            continue
+        _, data_start, size = read_element_header(buffer, position)
+        for seek_id, seek_position in read_seek_head(buffer, data_start, data_start + size):
+            if top_level_positions.get(segment_start + seek_position) != seek_id:
+                return 'invalid', f'The SeekHead entry for element {seek_id:#x} does not point at that element'
+
+    # Check that the Cues point at clusters
+    if CUES_ID in layout['elements']:
+        cues_start, cues_end = get_element_data_range(buffer, layout, CUES_ID)
+        for cue_point_id, _, cue_point_start, cue_point_end in iter_child_elements(buffer, cues_start, cues_end):
+            if cue_point_id != CUE_POINT_ID:
+                continue
+            for child_id, _, child_start, child_end in iter_child_elements(buffer, cue_point_start, cue_point_end):
+                if child_id != CUE_TRACK_POSITIONS_ID:
+                    continue
+                for position_id, _, position_start, position_end in iter_child_elements(buffer, child_start, child_end):
+                    if position_id == CUE_CLUSTER_POSITION_ID:
+                        cluster_position = segment_start + read_unsigned(buffer, position_start, position_end)
+                        if top_level_positions.get(cluster_position) != CLUSTER_ID:
+                            return 'invalid', f'A cue points at {cluster_position}, which is not a cluster'
+
+    # Check that the last cluster is complete
+    cluster_position, data_start, data_end = last_cluster
+    has_timestamp = False
+    for child_id, child_position, child_start, child_end in iter_child_elements(buffer, data_start, data_end):
+        if child_id == CLUSTER_TIMESTAMP_ID:
+            has_timestamp = True
+        elif child_id in (SIMPLE_BLOCK_ID, BLOCK_GROUP_ID):
+            read_element_header(buffer, child_position)
+    if not has_timestamp:
+        return 'invalid', f'The last cluster at {cluster_position} has no timestamp'
+
+    return 'valid', ''
@@ -1,74 +1,582 @@
 import os
-from pathlib import Path
-from dotenv import load_dotenv
-from plexapi.server import PlexServer
-
-# Load environment variables from .env file
-env_path = Path(__file__).parent.parent / '.env'
-load_dotenv(env_path)
-
-PLEX_SERVER_BASE_URL = os.getenv('PLEX_SERVER_URL', 'http://127.0.0.1:32400')
-PLEX_ACESS_TOKEN = os.getenv('PLEX_ACCESS_TOKEN')
-
-if not PLEX_ACESS_TOKEN:
-    raise ValueError(
-        "PLEX_ACCESS_TOKEN not found. Please create a .env file in the project root with:\n"
-        "PLEX_SERVER_URL=http://127.0.0.1:32400\n"
-        "PLEX_ACCESS_TOKEN=your_token_here"
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.cache_helpers import load_json_cache, save_json_cache
+
+# Path of the .env file holding the Plex server URL and access token
+ENV_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')
+
+# The settings and the connection to the Plex server are only created the first time they are needed,
+# and the same connection is then shared by everything in the process
+plex_settings = None
+plex_session = None
+plex_server = None
+plex_path_index = None
+plex_lookup_executor = None
+plex_connection_lock = threading.RLock()
+
+# Number of keep-alive connections kept open to the Plex server, which bounds how many requests can run at once
+PLEX_POOL_SIZE = 16
+
+# Failed connections, timeouts, and these server errors are retried with an exponential backoff
+PLEX_MAX_RETRIES = 3
+PLEX_RETRY_BACKOFF = 0.5
+PLEX_RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+# Seconds to wait for the Plex server to respond to a request
+PLEX_TIMEOUT = 30
+
+# Size of the chunks in which files are downloaded from the Plex server
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Name of the on-disk store for the path index and the version of its format
+PLEX_INDEX_CACHE_NAME = 'plex_path_index.json'
+PLEX_INDEX_VERSION = 2
+
+# Number of items requested from Plex at a time when paging through a library section
+PLEX_PAGE_SIZE = 500
+
+# Number of items fetched by rating key in a single request (bounded to keep the request URL short)
+PLEX_FETCH_BATCH_SIZE = 200
+
+# Number of edit requests sent to Plex at the same time
+PLEX_EDIT_WORKERS = 8
+
+# Number of lookups (including batches of bulk fetches) sent to Plex at the same time
+PLEX_LOOKUP_WORKERS = 8
+
+# Keys of the saved episode information that can be restored and the Plex fields they are restored to
+EPISODE_METADATA_FIELDS = {
+    'title': 'title',
+    'originally_available_at': 'originallyAvailableAt',
+    'summary': 'summary',
+}
+
+# Seconds to wait for the Plex server to finish scanning after a library update
+PLEX_REFRESH_TIMEOUT = 600
+
+# Seconds between checks of whether the Plex server is still scanning
+PLEX_REFRESH_POLL_INTERVAL = 1
+
+def get_plex_settings():
+    """Return the URL and access token of the Plex server, loading them from the .env file on first use."""
+    global plex_settings
+    if plex_settings is None:
+        from dotenv import load_dotenv
+        load_dotenv(ENV_PATH)
+
+        base_url = os.getenv('PLEX_SERVER_URL', 'http://127.0.0.1:32400')
+        access_token = os.getenv('PLEX_ACCESS_TOKEN')
+        if not access_token:
+            raise ValueError(
+                "PLEX_ACCESS_TOKEN not found. Please create a .env file in the project root with:\n"
+                "PLEX_SERVER_URL=http://127.0.0.1:32400\n"
+                "PLEX_ACCESS_TOKEN=your_token_here"
+            )
+        plex_settings = (base_url, access_token)
+    return plex_settings
+
+def create_plex_session():
+    """Create an HTTP session that keeps a pool of connections to the Plex server alive and retries transient failures."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    # Only idempotent methods (GET, PUT, DELETE, etc.) are retried; failed statuses are left for the caller to report
+    retry = Retry(
+        total=PLEX_MAX_RETRIES,
+        backoff_factor=PLEX_RETRY_BACKOFF,
+        status_forcelist=PLEX_RETRY_STATUS_CODES,
+        raise_on_status=False,
     )
+    adapter = HTTPAdapter(pool_connections=PLEX_POOL_SIZE, pool_maxsize=PLEX_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def get_plex_session():
+    """Return the HTTP session used for all traffic to the Plex server, creating it on first use."""
+    global plex_session
+    with plex_connection_lock:
+        if plex_session is None:
+            plex_session = create_plex_session()
+    return plex_session
+
+def get_plex_server():
+    """Return the connection to the Plex server shared by the whole process, connecting on first use."""
+    global plex_server
+    with plex_connection_lock:
+        if plex_server is None:
+            from plexapi.server import PlexServer
+            base_url, access_token = get_plex_settings()
+            plex_server = PlexServer(base_url, access_token, session=get_plex_session(), timeout=PLEX_TIMEOUT)
+    return plex_server
+
+def get_plex_errors():
+    """Return the exceptions raised when the Plex server is not configured, cannot be reached, or rejects a request."""
+    import requests
+    from plexapi.exceptions import PlexApiException
+    return (requests.exceptions.RequestException, PlexApiException, ValueError)
+
+def download_plex_file(key, output_path, params=None, etag=None, skip_same_size=False):
+    """Download the file at the key (e.g. the thumb of an item) from the Plex server through the shared session.
+
+    The file is written to a temporary file that replaces the output file once the download completes.
+    Returns the headers of the response, or None without writing anything if the server reports the ETag
+    still matches or, with skip_same_size, the file is the same size as the existing output file.
+    """
+    base_url, access_token = get_plex_settings()
+    headers = {'X-Plex-Token': access_token}
+    if etag:
+        headers['If-None-Match'] = etag
+
+    temporary_path = output_path + '.part'
+    with get_plex_session().get(f'{base_url}{key}', params=params, headers=headers, stream=True, timeout=PLEX_TIMEOUT) as response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+        # Closing the response before reading its body means the unchanged file is never transferred
+        content_length = response.headers.get('Content-Length')
+        if skip_same_size and content_length and os.path.exists(output_path) and int(content_length) == os.path.getsize(output_path):
+            return None
+
+        try:
+            with open(temporary_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+            os.replace(temporary_path, output_path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        return response.headers
+
+def get_plex_lookup_executor():
+    """Return the thread pool shared by the whole process for running Plex lookups in the background."""
+    global plex_lookup_executor
+    with plex_connection_lock:
+        if plex_lookup_executor is None:
+            plex_lookup_executor = ThreadPoolExecutor(max_workers=PLEX_LOOKUP_WORKERS)
+    return plex_lookup_executor
+
+def get_plex_path_index():
+    """Return the path index shared by the whole process; it is only built on the first lookup."""
+    global plex_path_index
+    plex = get_plex_server()
+    with plex_connection_lock:
+        if plex_path_index is None:
+            plex_path_index = PlexPathIndex(plex)
+    return plex_path_index
+
+def split_path(path):
+    """Return the components of a local or server path, which may use either kind of separator."""
+    return [component for component in re.split(r'[\\/]', path) if component]
+
+def replace_path_prefix(path, old_prefix, new_prefix):
+    """Return the path with the prefix replaced, or None if the path is not under the prefix."""
+    path_components = split_path(path)
+    prefix_components = split_path(old_prefix)
+    if path_components[:len(prefix_components)] != prefix_components:
+        return None
+    separator = '\\' if '\\' in new_prefix else '/'
+    return new_prefix.rstrip('\\/') + ''.join(separator + component for component in path_components[len(prefix_components):])
+
+def get_path_mappings():
+    """Return the (local prefix, server prefix) pairs of the PLEX_PATH_MAPPINGS setting, e.g. "/mnt/media=/data;Z:\\TV=/tv"."""
+    get_plex_settings()
+    mappings = []
+    for mapping in os.getenv('PLEX_PATH_MAPPINGS', '').split(';'):
+        if '=' in mapping:
+            local_prefix, server_prefix = mapping.split('=', 1)
+            mappings.append((local_prefix.strip(), server_prefix.strip()))
+    return mappings
+
+def iter_section_items(section, page_size=PLEX_PAGE_SIZE):
+    """Yield every episode or movie of a library section, fetching them from Plex one bounded page at a time.
+
+    Episodes are listed directly with their media and parts, so there is no request per show. Sections
+    that are neither TV shows nor movies (e.g. music and photos) are skipped.
+    """
+    if section.type == 'show':
+        libtype = 'episode'
+    elif section.type == 'movie':
+        libtype = 'movie'
+    else:
+        return
+
+    container_start = 0
+    while True:
+        page = section.search(libtype=libtype, container_start=container_start, container_size=page_size, maxresults=page_size)
+        yield from page
+        if len(page) < page_size:
+            break
+        container_start += page_size
+
+def fetch_plex_items(rating_keys, batch_size=PLEX_FETCH_BATCH_SIZE, max_workers=PLEX_LOOKUP_WORKERS):
+    """Fetch the items with the rating keys from Plex in concurrent batches and return a dictionary of rating keys to items."""
+    plex = get_plex_server()
+    rating_keys = sorted({int(rating_key) for rating_key in rating_keys})
+    batches = [rating_keys[start:start + batch_size] for start in range(0, len(rating_keys), batch_size)]
+    items = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        for batch_items in executor.map(plex.fetchItems, batches):
+            for item in batch_items:
+                # The response holds the full metadata of every item, so missing attributes must not trigger a reload per item
+                item._autoReload = False
+                items[item.ratingKey] = item
+    return items
+
+def apply_plex_edits(item_edits, max_workers=PLEX_EDIT_WORKERS, batch_size=PLEX_FETCH_BATCH_SIZE):
+    """Apply a list of (item, edits) pairs, where the edits are the field keys and values Plex expects (e.g. 'title.value').
+
+    Items of the same section that get identical edits (such as only locking fields) are edited together in a
+    single multi-edit request, the requests run concurrently, and no item is reloaded afterwards. Returns the
+    list of items whose edits failed.
+    """
+    plex = get_plex_server()
+    groups = {}
+    for item, edits in item_edits:
+        group_key = (item.librarySectionID, item.type, tuple(sorted(edits.items())))
+        groups.setdefault(group_key, []).append(item)
+
+    sections = {section.key: section for section in plex.library.sections()}
+    failed_items = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for (section_id, _, edits), items in groups.items():
+            for start in range(0, len(items), batch_size):
+                batch = items[start:start + batch_size]
+                futures[executor.submit(sections[section_id].multiEdit, batch, **dict(edits))] = batch
+
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f'Could not edit {len(futures[future])} item(s) in Plex: {e}')
+                failed_items.extend(futures[future])
+    return failed_items
+
+def format_field_value(value):
+    """Return the value of a field the way it is saved and compared (e.g. dates as str(datetime))."""
+    return '' if value is None else str(value)
+
+def get_metadata_edits(item, field_values):
+    """Return the edits that set and lock the fields of the item to the saved values, or an empty dictionary if it already matches.
+
+    Fields that already hold the saved value are only locked if they are not locked yet.
+    """
+    edits = {}
+    for field, value in field_values.items():
+        if format_field_value(getattr(item, field, None)) != value:
+            edits[f'{field}.value'] = value
+            edits[f'{field}.locked'] = 1
+        elif not item.isLocked(field):
+            edits[f'{field}.locked'] = 1
+    return edits
+
+def get_episode_metadata_edits(item, episode_info):
+    """Return the edits that restore the saved information of an episode, or an empty dictionary if it already matches."""
+    field_values = {}
+    for info_key, field in EPISODE_METADATA_FIELDS.items():
+        value = episode_info.get(info_key)
+        if value is not None and value != 'None':
+            field_values[field] = value
+    return get_metadata_edits(item, field_values)
+
+class PlexPathIndex:
+    """Map the paths of files known to Plex to the rating keys of their items and, for episodes, of their seasons.
+
+    The index is persisted between runs and each library section is only walked again when its
+    updatedAt timestamp changes, so lookups are dictionary accesses rather than library walks.
+    """
+    def __init__(self, plex):
+        self.plex = plex
+        self.sections = {}
+        self.paths = {}
+        self.basenames = {}
+        self.path_mappings = []
+        self.stale_section_keys = set()
+        self.is_built = False
+
+    def build(self):
+        """Load the persisted index and re-index only the sections that changed since it was saved."""
+        cache = load_json_cache(PLEX_INDEX_CACHE_NAME, default={})
+        cached_sections = {}
+        base_url = get_plex_settings()[0]
+        if cache.get('version') == PLEX_INDEX_VERSION and cache.get('server') == base_url:
+            cached_sections = cache.get('sections', {})
+
+        index_changed = False
+        for section in self.plex.library.sections():
+            if section.type not in ('show', 'movie'):
+                continue
+            section_key = str(section.key)
+            updated_at = int(section.updatedAt.timestamp()) if section.updatedAt else 0
+
+            cached_section = cached_sections.get(section_key)
+            if cached_section and cached_section['updated_at'] == updated_at and section_key not in self.stale_section_keys:
+                self.sections[section_key] = cached_section
+                continue
+
+            print(f'Indexing Plex library "{section.title}". . .')
+            self.sections[section_key] = {
+                'updated_at': updated_at,
+                'items': self._index_section(section),
+            }
+            index_changed = True
+
+        # Sections that were removed from the server also make the stored index stale
+        if index_changed or set(cached_sections) != set(self.sections):
+            save_json_cache(PLEX_INDEX_CACHE_NAME, {
+                'version': PLEX_INDEX_VERSION,
+                'server': base_url,
+                'sections': self.sections,
+            })
+
+        self.paths = {}
+        self.basenames = {}
+        for section in self.sections.values():
+            for path, entry in section['items'].items():
+                self.paths[path] = entry
+                # Base names shared by several files are ambiguous, so they are kept as None and never matched
+                basename = split_path(path)[-1]
+                self.basenames[basename] = None if basename in self.basenames else path
+        self.stale_section_keys = set()
+        self.is_built = True
+
+    def _index_section(self, section):
+        """Page through every item of the section and return a dictionary of part file paths to [rating key, season rating key] entries."""
+        items = {}
+        for media in iter_section_items(section):
+            season_rating_key = media.parentRatingKey if media.type == 'episode' else None
+            for part in media.iterParts():
+                items[part.file] = [media.ratingKey, season_rating_key]
+        return items
+
+    def ensure_built(self):
+        """Build the index unless it is already built; lookups from several threads only build it once."""
+        if not self.is_built:
+            with plex_connection_lock:
+                if not self.is_built:
+                    self.build()
+
+    def invalidate_sections(self, section_keys):
+        """Re-index the sections on the next lookup, even if the server has not changed their updatedAt timestamp yet."""
+        with plex_connection_lock:
+            self.stale_section_keys.update(str(section_key) for section_key in section_keys)
+            self.is_built = False
+
+    def get_entry(self, file_path):
+        """Return the index entry of the item that owns the file, matching the full path first and then the base name if it is unique."""
+        self.ensure_built()
+        entry = self.paths.get(file_path)
+        if entry is None:
+            entry = self.paths.get(self.basenames.get(os.path.basename(file_path)))
+        return entry
+
+    def get_server_path_rating_key(self, server_path):
+        """Return the rating key of the item with a part at exactly the server path, or None if there is none."""
+        self.ensure_built()
+        entry = self.paths.get(server_path)
+        return entry[0] if entry else None
+
+    def get_rating_key(self, file_path):
+        """Return the rating key of the item that owns the file, or None if Plex does not know about it."""
+        entry = self.get_entry(file_path)
+        return entry[0] if entry else None
+
+    def get_season_rating_key(self, file_path):
+        """Return the rating key of the season of the episode that owns the file, or None if it is not a known episode."""
+        entry = self.get_entry(file_path)
+        return entry[1] if entry else None
+
+    def learn_path_mapping(self, local_path):
+        """Learn how local paths translate to server paths from a file under the local path that Plex knows by its unique base name.
+
+        The components the two paths of that file have in common at their ends are assumed to be shared,
+        and what precedes them becomes a (local prefix, server prefix) mapping. Returns True if a mapping was learned.
+        """
+        if os.path.isfile(local_path):
+            candidates = [local_path]
+        else:
+            candidates = (os.path.join(root, file) for root, _, files in os.walk(local_path) for file in files)
+
+        for candidate in candidates:
+            server_path = self.basenames.get(os.path.basename(candidate))
+            if server_path is None:
+                continue
+            local_components = split_path(candidate)
+            server_components = split_path(server_path)
+            shared_count = 0
+            while shared_count < min(len(local_components), len(server_components)) and local_components[-1 - shared_count] == server_components[-1 - shared_count]:
+                shared_count += 1
+            # The shared components are removed from the local path itself, which keeps its drive or root
+            local_prefix = candidate
+            for _ in range(shared_count):
+                local_prefix = os.path.dirname(local_prefix)
+            server_separator = '\\' if '\\' in server_path else '/'
+            server_prefix = server_path[:len(server_path) - len(server_separator.join(server_components[-shared_count:]))]
+            self.path_mappings.append((local_prefix, server_prefix))
+            return True
+        return False
+
+    def get_server_path(self, local_path):
+        """Return the path under which the Plex server sees the local file or directory, or None if it cannot be determined.
+
+        Mappings from the PLEX_PATH_MAPPINGS setting are tried first, then mappings learned from files Plex knows.
+        """
+        self.ensure_built()
+        local_path = os.path.abspath(local_path)
+        for attempt in range(2):
+            for local_prefix, server_prefix in get_path_mappings() + self.path_mappings:
+                server_path = replace_path_prefix(local_path, local_prefix, server_prefix)
+                if server_path is not None:
+                    return server_path
+            if attempt == 0 and not self.learn_path_mapping(local_path):
+                break
+        return None
 
 class PlexInfo:
     def __init__(self):
         self.plex = self.get_plex_host()
-        self.last_section = None
-        self.last_media = None
+        self.index = get_plex_path_index()
     
     def get_plex_host(self):
-        return PlexServer(PLEX_SERVER_BASE_URL, PLEX_ACESS_TOKEN)
+        return get_plex_server()
+
+    def get_plex_item(self, file_path):
+        """Return the Plex episode or movie that owns the file, or None if Plex does not know about it."""
+        rating_key = self.index.get_rating_key(file_path)
+        if rating_key is None:
+            return None
+
+        from plexapi.exceptions import NotFound
+        try:
+            return self.plex.fetchItem(rating_key)
+        except NotFound:
+            return None
+
+    def get_plex_items(self, file_paths):
+        """Return a dictionary of the files known to Plex to their episodes or movies, fetched in bulk."""
+        rating_keys = {file_path: self.index.get_rating_key(file_path) for file_path in file_paths}
+        items = fetch_plex_items(rating_key for rating_key in rating_keys.values() if rating_key is not None)
+        return {file_path: items[rating_key] for file_path, rating_key in rating_keys.items() if rating_key in items}
 
     def get_plex_info(self, file_path):
-        if self.last_section and self.last_media and self.last_media.type == 'show':
-            for episode in self.last_media.episodes():
-                for part in episode.iterParts():
-                    if os.path.basename(part.file) == os.path.basename(file_path):
-                        return {
-                            'title': episode.title,
-                            'season': episode.seasonNumber,
-                            'episode': episode.index,
-                            'series': self.last_media.title,
-                            'originally_available_at': str(episode.originallyAvailableAt),
-                            'summary': episode.summary,
-                        }
-        
-        sections = self.plex.library.sections()
-        for section in sections:
-            for media in section.all():
-                if media.type == 'show':
-                    for episode in media.episodes():
-                        for part in episode.iterParts():
-                            if os.path.basename(part.file) == os.path.basename(file_path):
-                                self.last_section = section
-                                self.last_media = media
-                                return {
-                                    'title': episode.title,
-                                    'season': episode.seasonNumber,
-                                    'episode': episode.index,
-                                    'series': self.last_media.title,
-                                    'originally_available_at': str(episode.originallyAvailableAt),
-                                    'summary': episode.summary,
-                                }
-                elif media.type == 'movie':
-                    for part in media.iterParts():
-                        if os.path.basename(part.file) == os.path.basename(file_path):
-                            self.last_section = section
-                            self.last_media = media
-                            return {
-                                'title': media.title,
-                            }
-        return None
+        media = self.get_plex_item(file_path)
+        if media is None:
+            return None
+        return get_plex_info_from_item(media)
+
+    def get_plex_info_many(self, file_paths):
+        """Return a dictionary of every file to its Plex information (None for files Plex does not know), fetched in concurrent batches."""
+        items = self.get_plex_items(file_paths)
+        return {file_path: get_plex_info_from_item(items[file_path]) if file_path in items else None for file_path in file_paths}
+
+    def submit_plex_info_many(self, file_paths):
+        """Start looking up the Plex information of the files in the background, e.g. while they are probed, and return a future of the dictionary."""
+        return get_plex_lookup_executor().submit(self.get_plex_info_many, list(file_paths))
+
+def get_plex_info_from_item(media):
+    """Return the information this project uses about an episode or movie item."""
+    if media.type == 'episode':
+        return {
+            'title': media.title,
+            'season': media.seasonNumber,
+            'episode': media.index,
+            'series': media.grandparentTitle,
+            'originally_available_at': str(media.originallyAvailableAt),
+            'summary': media.summary,
+        }
+    elif media.type == 'movie':
+        return {
+            'title': media.title,
+        }
+    return None
+
+def get_section_for_path(sections, server_path):
+    """Return the library section whose folders contain the server path, or None if no section does."""
+    for section in sections:
+        for location in section.locations:
+            if replace_path_prefix(server_path, location, location) is not None:
+                return section
+    return None
+
+def get_section_scan_state(section):
+    """Return the times the section was last scanned and updated, which change once a scan of it finishes."""
+    # plexapi does not expose scannedAt, so it is read from the section's XML
+    return (section._data.attrib.get('scannedAt'), section.updatedAt)
+
+def wait_for_library_refresh(scan_states, timeout=PLEX_REFRESH_TIMEOUT):
+    """Wait until the scan of every section has finished and return False if the timeout is reached first.
+
+    scan_states maps the key of each scanned section to its get_section_scan_state from before the scan
+    was requested. A scan has finished once the section is no longer refreshing and it was either seen
+    refreshing or its scan state changed, so quick scans that end between two checks are not missed.
+    """
+    plex = get_plex_server()
+    start_time = time.monotonic()
+    pending_keys = set(scan_states)
+    started_keys = set()
+    while True:
+        for section in plex.library.sections():
+            if section.key not in pending_keys:
+                continue
+            if section.refreshing:
+                started_keys.add(section.key)
+            elif section.key in started_keys or get_section_scan_state(section) != scan_states[section.key]:
+                pending_keys.discard(section.key)
+        if not pending_keys:
+            return True
+        if time.monotonic() - start_time >= timeout:
+            print(f'Plex is still scanning after {round(timeout)} seconds. Continuing anyway.')
+            return False
+        time.sleep(PLEX_REFRESH_POLL_INTERVAL)
+
+def plex_update_libraries(paths=None, wait=True, timeout=PLEX_REFRESH_TIMEOUT):
+    """Tell the Plex server to update its libraries and, by default, wait for the scan to finish.
+
+    With paths, only the folders holding them are scanned, in the sections that contain them. If any of
+    the paths cannot be matched to a folder on the server, every library is scanned instead. An empty
+    list of paths scans nothing.
+    """
+    if paths is not None and not paths:
+        return True
+
+    plex = get_plex_server()
+    sections = [section for section in plex.library.sections() if section.type in ('show', 'movie')]
+
+    scans = {}
+    if paths is not None:
+        for path in paths:
+            # Paths inside a section folder are used as they are, and other paths are translated to the server's view
+            server_path = os.path.abspath(path)
+            section = get_section_for_path(sections, server_path)
+            if section is None:
+                server_path = get_plex_path_index().get_server_path(path)
+                section = get_section_for_path(sections, server_path) if server_path else None
+            if section is None:
+                print(f'Could not find "{path}" in the Plex libraries. Updating all libraries instead.')
+                scans = {}
+                break
+            scans[server_path] = section
+
+    # The scan state of the sections is recorded before the scans are requested to tell when they have finished
+    if scans:
+        scan_states = {section.key: get_section_scan_state(section) for section in scans.values()}
+        for server_path, section in scans.items():
+            section.update(path=server_path)
+    else:
+        scan_states = {section.key: get_section_scan_state(section) for section in sections}
+        plex.library.update()
+
+    is_complete = wait_for_library_refresh(scan_states, timeout=timeout) if wait else True
 
-def plex_update_libraries():
-    """Tell the Plex server to update its libraries"""
-    plex = PlexServer(PLEX_SERVER_BASE_URL, PLEX_ACESS_TOKEN)
-    plex.library.update()
-    return
\ No newline at end of file
+    # Updated sections are re-indexed the next time a path is looked up, whether or not the scan was waited for
+    if plex_path_index is not None:
+        plex_path_index.invalidate_sections(scan_states)
+    return is_complete
\ No newline at end of file
@@ -103,7 +103,7 @@ def prompt_for_tracks_languages(tracks_info, force_language_prompt=False):
                 if language == '':
                     break
                 elif is_valid_language_code(language):
-                    track['language'] = language
+                    track['language'] = normalize_language_code(language)
                     break
                 else:
                     print("Please input a valid 3-letter language code (e.g. 'eng' or 'jpn').")
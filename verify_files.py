@@ -1,34 +1,140 @@
 import os
+import csv
+import json
 import argparse
 import subprocess
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from utils.file_management_helpers import *
+from utils.cache_helpers import get_file_identity, load_json_cache, save_json_cache
+from utils.matroska_helpers import check_matroska_structure
+
+# Number of files validated at the same time
+VERIFY_WORKERS = 4
+
+# mkvalidator is given a base timeout plus extra time for every GiB of the file
+BASE_TIMEOUT = 30
+TIMEOUT_PER_GIB = 15
+
+# In the full mode every file that passes the native structure check is also run through mkvalidator,
+# while in the fast mode only the files the structure check cannot judge are
+FULL_MODE = 'full'
+FAST_MODE = 'fast'
+
+# Name of the on-disk store of files that have already been validated
+VERIFY_CACHE_NAME = 'verify_cache.json'
+
+def get_timeout(file_size, base_timeout=BASE_TIMEOUT, timeout_per_gib=TIMEOUT_PER_GIB):
+    """Return the number of seconds mkvalidator may take for a file of the given size."""
+    return base_timeout + timeout_per_gib * file_size / (1024 ** 3)
+
+def validate_file(file_path, base_timeout=BASE_TIMEOUT, timeout_per_gib=TIMEOUT_PER_GIB):
+    """Run mkvalidator on the file and return a dictionary describing the result."""
+    file_size = os.path.getsize(file_path)
+    timeout = get_timeout(file_size, base_timeout=base_timeout, timeout_per_gib=timeout_per_gib)
+    command = ['mkvalidator', '--no-warn', '--quick', file_path]
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {'file_path': file_path, 'status': 'timeout', 'details': f'Timeout after {round(timeout)} seconds'}
+
+    output = result.stdout
+    # Ensures the command returned with no errors
+    if "the file appears to be valid" not in output:
+        cleaned_output = re.sub(r'\.{2,}', '', output).strip()
+        return {'file_path': file_path, 'status': 'invalid', 'details': cleaned_output}
+    return {'file_path': file_path, 'status': 'valid', 'details': ''}
+
+def check_file(file_path, mode=FULL_MODE, base_timeout=BASE_TIMEOUT, timeout_per_gib=TIMEOUT_PER_GIB):
+    """Check the file with the native structure scanner and, when needed, with mkvalidator.
+
+    Definite structural failures are reported without running mkvalidator. In the fast mode, files the
+    scanner finds structurally valid are not sent to mkvalidator either; only ambiguous files are.
+    """
+    if file_path.lower().endswith(NATIVE_PROBE_EXTENSIONS):
+        status, details = check_matroska_structure(file_path)
+        if status == 'invalid' or (status == 'valid' and mode == FAST_MODE):
+            return {'file_path': file_path, 'status': status, 'details': details}
+    return validate_file(file_path, base_timeout=base_timeout, timeout_per_gib=timeout_per_gib)
+
+def verify_files(mkv_files, mode=FULL_MODE, max_workers=VERIFY_WORKERS, base_timeout=BASE_TIMEOUT, timeout_per_gib=TIMEOUT_PER_GIB, use_cache=True):
+    """Validate the files concurrently, skipping files that were already found valid and have not changed since.
+
+    Files only checked in the fast mode are checked again in the full mode. Returns the results in the
+    same order as the files.
+    """
+    cache = load_json_cache(VERIFY_CACHE_NAME, default={}) if use_cache else {}
+    results = [None] * len(mkv_files)
+    identities = {}
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for index, file_path in enumerate(mkv_files):
+                key = os.path.abspath(file_path)
+                try:
+                    identities[key] = get_file_identity(file_path)
+                except OSError as e:
+                    results[index] = {'file_path': file_path, 'status': 'error', 'details': str(e)}
+                    print(f'Could not read "{os.path.basename(file_path)}": {e}')
+                    continue
+                cache_entry = cache.get(key)
+                if isinstance(cache_entry, dict) and cache_entry['identity'] == identities[key] and (cache_entry['mode'] == FULL_MODE or mode == FAST_MODE):
+                    results[index] = {'file_path': file_path, 'status': 'valid', 'details': 'Unchanged since it was last validated'}
+                    print(f'Skipped unchanged "{os.path.basename(file_path)}"')
+                    continue
+                futures[executor.submit(check_file, file_path, mode, base_timeout, timeout_per_gib)] = index
+
+            for future in as_completed(futures):
+                index = futures[future]
+                file_path = mkv_files[index]
+                key = os.path.abspath(file_path)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # A missing mkvalidator or an unreadable file only fails this file, not the whole run
+                    result = {'file_path': file_path, 'status': 'error', 'details': str(e) or type(e).__name__}
+                results[index] = result
+
+                if result['status'] == 'valid':
+                    cache[key] = {'identity': identities[key], 'mode': mode}
+                    print(f'Validated "{os.path.basename(file_path)}"')
+                else:
+                    cache.pop(key, None)
+                    if result['status'] == 'timeout':
+                        print(f'Timeout while processing file "{os.path.basename(file_path)}"')
+                    else:
+                        print(f'Could not validate "{os.path.basename(file_path)}"')
+                        print(result['details'])
+    finally:
+        # Keep the files validated so far even if the run is interrupted
+        if use_cache:
+            save_json_cache(VERIFY_CACHE_NAME, cache)
+
+    return results
+
+def write_report(results, report_path):
+    """Write the results to a JSON or CSV file depending on the extension of the report path."""
+    if report_path.lower().endswith('.csv'):
+        with open(report_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=['file_path', 'status', 'details'])
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
 
 def main(args):
     directory = args.directory
-    
-    mkv_files = get_video_files_from_directory(directory)
+
+    if args.recursive:
+        mkv_files = get_video_files_from_directory_and_subdirectories(directory)
+    else:
+        mkv_files = get_video_files_from_directory(directory)
 
     print(f'Checking the integrity of {len(mkv_files)} file(s).')
-    invalid_files = []
-    for file_path in mkv_files:
-        command = f'mkvalidator --no-warn --quick "{file_path}"'
-        try:
-            result = subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=30)
-            output = result.stdout
-
-            # Ensures the command returned with no errors
-            if "the file appears to be valid" not in output:
-                invalid_files.append(file_path)
-                print(f'Could not validate "{os.path.basename(file_path)}"')
-                cleaned_output = re.sub(r'\.{2,}', '', output).strip()
-                print(cleaned_output)
-            else:
-                print(f'Validated "{os.path.basename(file_path)}"')
-
-        except subprocess.TimeoutExpired:
-            print(f'Timeout while processing file "{os.path.basename(file_path)}"')
-            invalid_files.append(file_path)
+    results = verify_files(mkv_files, mode=args.mode, max_workers=args.workers, base_timeout=args.timeout, timeout_per_gib=args.timeout_per_gib, use_cache=not args.no_cache)
+    invalid_files = [result['file_path'] for result in results if result['status'] != 'valid']
 
     if invalid_files:
         print("\n\n*** Invalid files detected: ***\n")
@@ -38,9 +144,20 @@ def main(args):
     else:
         print("\n\nAll files are valid.\n")
 
+    if args.report:
+        write_report(results, args.report)
+        print(f'Report saved as: {args.report}')
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(prog='mkvverify', description="Use mkvalidator to check all the MKV files in a directory.")
     parser.add_argument('directory', nargs='?', default=os.getcwd(), help='Directory to process')
-    
+    parser.add_argument('-r', '--recursive', action='store_true', help='Recursively search the directory for video files.')
+    parser.add_argument('-m', '--mode', choices=[FULL_MODE, FAST_MODE], default=FULL_MODE, help='In fast mode, only check the structure of MKV files natively and use mkvalidator for files that cannot be judged that way.')
+    parser.add_argument('-w', '--workers', type=int, default=VERIFY_WORKERS, help='Number of files to validate at the same time.')
+    parser.add_argument('--timeout', type=float, default=BASE_TIMEOUT, help='Base number of seconds mkvalidator may take for each file.')
+    parser.add_argument('--timeout-per-gib', type=float, default=TIMEOUT_PER_GIB, help='Additional seconds mkvalidator may take for every GiB of a file.')
+    parser.add_argument('--no-cache', action='store_true', help='Validate every file, even those that were already validated and have not changed.')
+    parser.add_argument('--report', default=None, help='Save the results to this file as JSON, or as CSV if the name ends in .csv.')
+
     args = parser.parse_args()
     main(args)